@@ -0,0 +1,133 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Hashable, List
+
+import numpy as np
+
+
+class _Pending:
+    """Lignes d'une requête en attente de prédiction"""
+
+    __slots__ = ('rows', 'key', 'future')
+
+    def __init__(self, rows: np.ndarray, key: Hashable):
+        self.rows = rows
+        self.key = key
+        self.future: Future = Future()
+
+
+class MicroBatcher:
+    """
+    Regroupe les petites prédictions concurrentes en un seul appel au modèle.
+
+    Les lignes soumises par les threads Flask sont mises en file; un thread de fond
+    attend au plus window_ms après la première (ou max_rows lignes), puis appelle
+    predict(matrice, clé) une fois par clé (bundle de modèles) et rend à chaque
+    requête sa tranche de résultats.
+
+    - window_ms = 0: mode direct, predict() est appelé dans le thread de la requête
+    - une requête de max_rows lignes ou plus est toujours prédite directement
+    - une requête qui attend plus de max_latency_ms est prédite directement
+    """
+
+    def __init__(self, predict: Callable[[np.ndarray, Hashable], np.ndarray],
+                 window_ms: float = 2.0, max_rows: int = 256, max_latency_ms: float = 50.0):
+        self.predict = predict
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+        self.max_latency = max_latency_ms / 1000.0
+        self.batches = 0
+        self.rows = 0
+        self.timeouts = 0
+        self._queue: 'queue.Queue[_Pending]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _ensure_worker(self):
+        """Démarre le thread de regroupement (une fois par processus, y compris après un fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self._queue,), daemon=True).start()
+                self._pid = os.getpid()
+
+    def submit(self, rows, key: Hashable) -> np.ndarray:
+        """Prédit les lignes (regroupées avec celles des autres requêtes si possible)"""
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+        if not self.enabled or len(rows) >= self.max_rows:
+            return self.predict(rows, key)
+
+        self._ensure_worker()
+        pending = _Pending(rows, key)
+        self._queue.put(pending)
+        try:
+            return pending.future.result(timeout=self.max_latency)
+        except FutureTimeout:
+            # Pas encore pris en charge: on l'annule et on prédit directement
+            if pending.future.cancel():
+                self.timeouts += 1
+                return self.predict(rows, key)
+            return pending.future.result()
+
+    def _collect(self, pending_queue: 'queue.Queue[_Pending]') -> List[_Pending]:
+        """Première requête en attente + celles qui arrivent pendant la fenêtre"""
+        batch = [pending_queue.get()]
+        count = len(batch[0].rows)
+        deadline = time.monotonic() + self.window
+        while count < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = pending_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            count += len(pending.rows)
+        return batch
+
+    def _run(self, pending_queue: 'queue.Queue[_Pending]'):
+        while True:
+            batch = [pending for pending in self._collect(pending_queue)
+                     if pending.future.set_running_or_notify_cancel()]
+
+            groups: Dict[Hashable, List[_Pending]] = {}
+            for pending in batch:
+                groups.setdefault(pending.key, []).append(pending)
+
+            for key, items in groups.items():
+                try:
+                    preds = self.predict(np.vstack([pending.rows for pending in items]), key)
+                except Exception as e:
+                    for pending in items:
+                        pending.future.set_exception(e)
+                    continue
+
+                self.batches += 1
+                start = 0
+                for pending in items:
+                    end = start + len(pending.rows)
+                    pending.future.set_result(preds[start:end])
+                    start = end
+                self.rows += start
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'enabled': self.enabled,
+            'window_ms': self.window * 1000,
+            'max_rows': self.max_rows,
+            'batches': self.batches,
+            'rows': self.rows,
+            'timeouts': self.timeouts
+        }
@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class ForecastCache:
+    """
+    Cache LRU borné des prévisions, valable jusqu'au changement de jour.
+
+    Les clés contiennent la date de début de la prévision: au premier accès d'un
+    nouveau jour, toutes les entrées de la veille sont évincées d'un coup.
+    Les valeurs sont partagées entre les réponses: elles ne doivent pas être modifiées.
+    """
+
+    def __init__(self, maxsize: int = 4096, today: Callable[[], date] = date.today):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {'size': 0, 'expired': 0, 'invalidated': 0}
+        self._today = today
+        self._day = today()
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        """Vide le cache si le jour a changé (appelé sous le verrou)"""
+        today = self._today()
+        if today != self._day:
+            self.evictions['expired'] += len(self._entries)
+            self._entries.clear()
+            self._day = today
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retourne la prévision en cache (et la marque comme récente), None sinon"""
+        with self._lock:
+            self._expire()
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Ajoute une prévision en évinçant la moins récemment utilisée si besoin"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._expire()
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions['size'] += 1
+
+    def clear(self):
+        """Vide le cache (rechargement des modèles ou des profils)"""
+        with self._lock:
+            self.evictions['invalidated'] += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs de hits/misses/évictions et taille courante"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': dict(self.evictions)
+            }
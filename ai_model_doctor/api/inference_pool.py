@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+
+def inference_settings(environ: Mapping[str, str]) -> Tuple[int, int]:
+    """
+    (workers, queue_limit) du pool d'après DOCTOR_MODEL_INFERENCE_WORKERS et
+    DOCTOR_MODEL_INFERENCE_QUEUE; lu aussi par gunicorn.conf.py pour dimensionner threads
+    """
+    workers = int(environ.get('DOCTOR_MODEL_INFERENCE_WORKERS', 4))
+    queue_limit = int(environ.get('DOCTOR_MODEL_INFERENCE_QUEUE', max(1, workers) * 8))
+    return workers, queue_limit
+
+
+class InferencePoolFull(Exception):
+    """La file d'attente du pool (ou la limite de la route) est pleine"""
+
+
+class DeadlineExceeded(Exception):
+    """L'échéance de la requête est passée avant le début du calcul"""
+
+
+class InferencePool:
+    """
+    Pool borné de threads pour les calculs de prédiction.
+
+    - au plus queue_limit tâches en attente ou en cours, au-delà InferencePoolFull
+    - au plus route_limits[route] tâches par route (default_route_limit sinon)
+    - une tâche dont l'échéance est passée quand un thread la prend n'est pas exécutée
+    workers = 0: pas de pool, la tâche est exécutée dans le thread appelant
+    (les limites par route et l'échéance restent appliquées).
+    """
+
+    def __init__(self, workers: int, queue_limit: int, route_limits: Optional[Dict[str, int]] = None,
+                 default_route_limit: Optional[int] = None):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.route_limits = dict(route_limits or {})
+        self.default_route_limit = default_route_limit or queue_limit
+        self.queued = 0
+        self.running = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference') if workers > 0 else None
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._route_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _route_semaphore(self, route: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._route_slots.get(route)
+            if semaphore is None:
+                limit = self.route_limits.get(route, self.default_route_limit)
+                semaphore = self._route_slots[route] = threading.BoundedSemaphore(limit)
+            return semaphore
+
+    def _execute(self, fn: Callable, deadline: Optional[float], args, kwargs) -> Any:
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            if deadline is not None and time.monotonic() > deadline:
+                raise DeadlineExceeded('request deadline exceeded before inference started')
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def run(self, route: str, fn: Callable, *args, deadline: Optional[float] = None, **kwargs) -> Any:
+        """
+        Exécute fn(*args, **kwargs) dans le pool et attend son résultat.
+        deadline: échéance en time.monotonic(), vérifiée juste avant le calcul.
+        """
+        route_slots = self._route_semaphore(route)
+        if not route_slots.acquire(blocking=False):
+            raise InferencePoolFull(f'too many concurrent requests on {route}')
+        try:
+            if not self._slots.acquire(blocking=False):
+                raise InferencePoolFull(f'inference queue is full ({self.queue_limit} pending)')
+            try:
+                with self._lock:
+                    self.queued += 1
+                if self._executor is None:
+                    return self._execute(fn, deadline, args, kwargs)
+                return self._executor.submit(self._execute, fn, deadline, args, kwargs).result()
+            finally:
+                self._slots.release()
+        finally:
+            route_slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_limit': self.queue_limit,
+                'queued': self.queued,
+                'running': self.running
+            }
@@ -1,86 +1,443 @@
 # api/model_api.py
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, copy_current_request_context, request, jsonify
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-import joblib
 import json
-from datetime import datetime, timedelta
+import hashlib
+import hmac
+import os
+import sys
+import time as clock
+from datetime import date, datetime, time, timedelta
+from functools import wraps
+
+# Module d'instrumentation partagé avec python-ai
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'python-common'))
+from instrumentation import MetricsRegistry, instrument_flask
+
+# Compilateur d'arbres et feature store partagés avec les scripts d'entraînement
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+from feature_store import FEATURE_COLUMNS, FeatureHistory
+
+from model_registry import ModelRegistry
+from forecast_cache import ForecastCache
+from batching import MicroBatcher
+from inference_pool import DeadlineExceeded, InferencePool, InferencePoolFull, inference_settings
 
 app = Flask(__name__)
 CORS(app)  # Permet les requêtes depuis Symfony
 
-# Charger les modèles
+# Métriques Prometheus exposées sur /metrics
+metrics = MetricsRegistry('wellora_doctor_model')
+instrument_flask(app, metrics)
+
+# Charger les modèles et les profils des médecins (bundle versionné, rechargeable à chaud)
 print("🔄 Chargement des modèles...")
-activity_predictor = joblib.load('models/saved_models/activity_predictor.pkl')
-scaler = joblib.load('models/saved_models/scaler.pkl')
-label_encoders = joblib.load('models/saved_models/label_encoders.pkl')
-clustering_model = joblib.load('models/saved_models/clustering_model.pkl')
-clustering_scaler = joblib.load('models/saved_models/clustering_scaler.pkl')
+MODELS_DIR = os.environ.get('DOCTOR_MODEL_DIR', 'models/saved_models')
+# Tableaux des modèles mappés en mémoire (partagés entre workers), voir gunicorn.conf.py
+MODELS_MMAP = os.environ.get('DOCTOR_MODEL_MMAP', '1') == '1'
+# Prédictions par le modèle compilé en tableaux NumPy (models/tree_compiler.py)
+MODELS_COMPILED = os.environ.get('DOCTOR_MODEL_COMPILED', '1') == '1'
+registry = ModelRegistry(MODELS_DIR, mmap=MODELS_MMAP, compiled=MODELS_COMPILED)
+
+
+@app.before_request
+def _follow_shared_state():
+    """
+    Chaque worker suit la version publiée par reload/rollback (models_dir/ACTIVE.json),
+    les modifications de doctor_profiles.csv (lues par toutes les routes) et les
+    journées ajoutées à l'historique des features par les autres workers
+    """
+    registry.sync()
+    registry.refresh_profiles()
+    feature_history.refresh()
+
+
+# Prévisions par médecin en cache jusqu'au changement de jour, vidé à chaque changement de bundle
+forecast_cache = ForecastCache(int(os.environ.get('DOCTOR_MODEL_FORECAST_CACHE_SIZE', 4096)))
+registry.on_swap(lambda bundle: forecast_cache.clear())
+metrics.callback(
+    'forecast_cache_requests_total', 'Consultations du cache de prévisions', 'counter', ('result',),
+    lambda: {('hit',): forecast_cache.hits, ('miss',): forecast_cache.misses}
+)
+metrics.callback(
+    'forecast_cache_evictions_total', 'Prévisions évincées du cache', 'counter', ('reason',),
+    lambda: {(reason,): count for reason, count in forecast_cache.evictions.items()}
+)
+
+# Features en ligne des médecins (moyennes mobiles, tendance) pour le modèle complet
+# (FEATURE_COLUMNS). L'historique est lu au démarrage (avant le fork des workers);
+# /api/features/ingest l'ajoute au fichier et chaque worker relit la fin du fichier
+# avant ses requêtes: tous les workers ont le même état, conservé aux redémarrages.
+FEATURE_HISTORY = os.environ.get('DOCTOR_FEATURE_HISTORY', os.path.join(MODELS_DIR, 'feature_history.csv'))
+feature_history = FeatureHistory(FEATURE_HISTORY)
+print(f"📈 Feature store: {len(feature_history.store)} médecins")
+metrics.callback(
+    'feature_store_doctors', 'Médecins présents dans le feature store', 'gauge', (),
+    lambda: {(): len(feature_history.store)}
+)
+
+
+def _uses_feature_store(bundle):
+    """Le modèle attend le vecteur complet de l'entraînement (sinon les features de base)"""
+    return getattr(bundle.scaler, 'n_features_in_', None) == len(FEATURE_COLUMNS)
+
+# Jeton des endpoints d'administration (désactivés si absent)
+ADMIN_TOKEN = os.environ.get('DOCTOR_MODEL_ADMIN_TOKEN', '')
+
+# Horizon de prévision par défaut et maximal (en jours)
+FORECAST_HORIZON = 7
+MAX_FORECAST_HORIZON = 90
+
+# Features envoyées par le backend et valeurs par défaut si absentes
+BASE_FEATURES = ('avg_consultation_time', 'popularity_score', 'actual_consultations')
+FEATURE_DEFAULTS = {'avg_consultation_time': 30.0, 'popularity_score': 0.5, 'actual_consultations': 0.0}
+
+# /api/predict/batch: nombre maximal de médecins par appel et taille des blocs prédits
+MAX_BATCH_DOCTORS = int(os.environ.get('DOCTOR_MODEL_MAX_BATCH', 10000))
+BATCH_CHUNK_SIZE = max(1, int(os.environ.get('DOCTOR_MODEL_BATCH_CHUNK', 2048)))
+
+
+def _run_predict(rows, bundle):
+    """Un seul transform + predict pour toute la matrice"""
+    if bundle.compiled is not None:
+        # Scaler replié dans les seuils: pas d'étape de scaling
+        with metrics.stage('model_predict'):
+            return bundle.compiled.predict(rows)
+    with metrics.stage('feature_scaling'):
+        # Scaling en float64 comme pour une ligne seule (la matrice du batch est en float32)
+        features_scaled = bundle.scaler.transform(np.asarray(rows, dtype=np.float64))
+    with metrics.stage('model_predict'):
+        return bundle.activity_predictor.predict(features_scaled)
 
-# Charger les profils des médecins
-doctor_profiles = pd.read_csv('models/saved_models/doctor_profiles.csv')
+
+# Regroupement des petites prédictions concurrentes (DOCTOR_MODEL_BATCH_WINDOW_MS=0: direct)
+batcher = MicroBatcher(
+    _run_predict,
+    window_ms=float(os.environ.get('DOCTOR_MODEL_BATCH_WINDOW_MS', 0)),
+    max_rows=int(os.environ.get('DOCTOR_MODEL_BATCH_MAX_ROWS', 256)),
+    max_latency_ms=float(os.environ.get('DOCTOR_MODEL_BATCH_MAX_LATENCY_MS', 50))
+)
+metrics.callback(
+    'prediction_batches_total', 'Prédictions regroupées exécutées par le micro-batching', 'counter', (),
+    lambda: {(): batcher.batches}
+)
+metrics.callback(
+    'prediction_batched_rows_total', 'Lignes prédites via le micro-batching', 'counter', (),
+    lambda: {(): batcher.rows}
+)
+metrics.callback(
+    'prediction_batch_timeouts_total', 'Requêtes prédites directement après max_latency_ms', 'counter', (),
+    lambda: {(): batcher.timeouts}
+)
+
+
+def _predict_matrix(rows, bundle=None):
+    """Prédit toutes les lignes d'une matrice de features (regroupées avec d'autres requêtes si activé)"""
+    return batcher.submit(rows, bundle or registry.active)
+
+
+def _feature_values(features):
+    """Features de base (sans is_weekend) à partir des valeurs envoyées par le backend"""
+    return [float(features.get(name, FEATURE_DEFAULTS[name])) for name in BASE_FEATURES]
 
 
 def _predict_from_features(features, is_weekend=0):
-    avg_time = float(features.get('avg_consultation_time', 30))
-    popularity = float(features.get('popularity_score', 0.5))
-    actual = float(features.get('actual_consultations', 0))
-    values = [avg_time, popularity, actual, float(is_weekend)]
-    features_scaled = scaler.transform([values])
-    pred = activity_predictor.predict(features_scaled)[0]
-    return int(pred)
+    values = _feature_values(features) + [float(is_weekend)]
+    return int(_predict_matrix([values])[0])
+
+
+def _base_rows(base_values, horizon=FORECAST_HORIZON):
+    """
+    Une ligne de features de base par jour (is_weekend = jours 5 et 6 de chaque
+    semaine à partir d'aujourd'hui)
+    """
+    days = np.arange(horizon)
+    rows = np.empty((horizon, len(base_values) + 1), dtype=float)
+    rows[:, :-1] = base_values
+    rows[:, -1] = (days % 7 >= 5).astype(float)
+    return rows
+
+
+def _forecast(rows, bundle=None, start=None):
+    """Prévision jour par jour à partir de `start`: une seule prédiction pour la matrice"""
+    preds = _predict_matrix(rows, bundle)
+    
+    start = start or datetime.now()
+    predictions = []
+    for day, pred in enumerate(preds):
+        date = start + timedelta(days=day)
+        predictions.append({
+            'day': date.strftime('%Y-%m-%d'),
+            'day_name': date.strftime('%A'),
+            'predicted_consultations': int(pred)
+        })
+    return predictions
+
+
+def _build_prediction_table(bundle):
+    """
+    Score tous les profils en une seule prédiction et pré-encode la réponse de
+    /api/predict/all (corps JSON sans generated_at + ETag), une fois par bundle de modèles
+    """
+    store = bundle.profile_store
+    if _uses_feature_store(bundle):
+        # Modèle complet: médecins ayant un historique, vecteur du jour depuis le feature store
+        # (un médecin dont le vecteur ne peut pas être construit est ignoré, pas toute la table).
+        # Calendrier d'aujourd'hui, moyennes mobiles du dernier jour enregistré (voir feature_store)
+        today = date.today()
+        feature_store = feature_history.store
+        rows, vectors = [], []
+        for row, doctor_id in enumerate(store.doctor_ids.tolist()):
+            if doctor_id not in feature_store:
+                continue
+            try:
+                vectors.append(feature_store.vector(doctor_id, bundle.label_encoders, today))
+            except (KeyError, ValueError) as e:
+                print(f"⚠️ Médecin {doctor_id} ignoré dans /api/predict/all: {e}")
+                continue
+            rows.append(row)
+        matrix = np.array(vectors).reshape(len(rows), len(FEATURE_COLUMNS))
+    else:
+        rows = list(range(store.size))
+        matrix = store.features
+    preds = _predict_matrix(matrix, bundle) if rows else np.empty(0)
+    
+    all_predictions = [
+        {
+            'doctor_id': int(store.doctor_ids[row]),
+            'specialty': store.specialties[row],
+            'predicted_daily_avg': int(pred),
+            'cluster': int(store.clusters[row])
+        }
+        for row, pred in zip(rows, preds.tolist())
+    ]
+    
+    with metrics.stage('json_encoding'):
+        predictions_json = json.dumps(all_predictions, sort_keys=True).encode('utf-8')
+        # Clés dans l'ordre de sort_keys; generated_at est ajouté à chaque réponse (_stamp_generated_at)
+        body = b'{"predictions": ' + predictions_json + b', "total_doctors": %d}' % len(all_predictions)
+    # ETag sur les prédictions seules: identique quel que soit le worker qui a construit la table
+    return body, hashlib.sha256(predictions_json).hexdigest()
+
+
+def _stamp_generated_at(body):
+    """Ajoute generated_at (heure de la réponse) en tête du corps pré-encodé de la table"""
+    generated_at = json.dumps(datetime.now().isoformat()).encode('utf-8')
+    return b'{"generated_at": ' + generated_at + b', ' + body[1:]
+
+
+def _get_prediction_table():
+    active = registry.active
+    if not _uses_feature_store(active):
+        return active.derived('prediction_table', _build_prediction_table)
+    
+    # Modèle complet: table recalculée après une ingestion ou un changement de jour
+    key = (feature_history.store.revision, date.today())
+    slot = active.derived('feature_prediction_table', lambda bundle: {})
+    entry = slot.get('entry')
+    if entry is None or entry[0] != key:
+        entry = slot['entry'] = (key, _build_prediction_table(active))
+    return entry[1]
+
+
+def _batch_feature_matrix(doctors):
+    """
+    Matrice float32 (une ligne par médecin, is_weekend = 0) construite colonne par colonne.
+    Les valeurs absentes prennent leur valeur par défaut; retourne (matrice, indices invalides).
+    """
+    records = [
+        doctor.get('features') or {} if isinstance(doctor, dict) else None
+        for doctor in doctors
+    ]
+    malformed = np.array([not isinstance(record, dict) for record in records], dtype=bool)
+    frame = pd.DataFrame.from_records(
+        [record if isinstance(record, dict) else {} for record in records],
+        columns=list(BASE_FEATURES)
+    )
+    
+    matrix = np.zeros((len(records), len(BASE_FEATURES) + 1), dtype=np.float32)
+    invalid = malformed
+    for column, name in enumerate(BASE_FEATURES):
+        raw = frame[name]
+        values = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=np.float64)
+        invalid = invalid | (np.isnan(values) & raw.notna().to_numpy()) | np.isinf(values)
+        matrix[:, column] = np.where(np.isnan(values), FEATURE_DEFAULTS[name], values)
+    
+    return matrix, np.flatnonzero(invalid).tolist()
+
+
+def _store_feature_matrix(doctors, bundle):
+    """
+    Modèle complet: vecteur du jour pris dans le feature store pour chaque doctor_id.
+    Retourne (matrice, indices invalides = médecins sans historique ou au vecteur incomplet).
+    """
+    today = date.today()
+    feature_store = feature_history.store
+    matrix = np.zeros((len(doctors), len(FEATURE_COLUMNS)), dtype=np.float64)
+    invalid = []
+    for index, doctor in enumerate(doctors):
+        doctor_id = doctor.get('doctor_id') if isinstance(doctor, dict) else None
+        if not isinstance(doctor_id, int) or doctor_id not in feature_store:
+            invalid.append(index)
+            continue
+        try:
+            matrix[index] = feature_store.vector(doctor_id, bundle.label_encoders, today)
+        except (KeyError, ValueError):
+            invalid.append(index)
+    return matrix, invalid
+
+
+def _predict_chunked(matrix, chunk_size=BATCH_CHUNK_SIZE, bundle=None):
+    """Prédit une grande matrice par blocs de chunk_size lignes (ordre conservé)"""
+    bundle = bundle or registry.active
+    preds = np.empty(len(matrix), dtype=np.float64)
+    for start in range(0, len(matrix), chunk_size):
+        preds[start:start + chunk_size] = _predict_matrix(matrix[start:start + chunk_size], bundle)
+    return preds
+
+
+def _cached_forecast(subject, build_rows, horizon, bundle=None):
+    """
+    Prévision en cache pour la journée: clé (version des modèles, médecin ou vecteur
+    de features, date de début, horizon). build_rows(start, horizon) -> matrice
+    """
+    bundle = bundle or registry.active
+    today = date.today()
+    key = (bundle.version, subject, today.isoformat(), horizon)
+    
+    predictions = forecast_cache.get(key)
+    if predictions is None:
+        predictions = _forecast(build_rows(today, horizon), bundle, datetime.combine(today, time()))
+        forecast_cache.put(key, predictions)
+    return predictions
+
+
+def _store_forecast(doctor_id, horizon, bundle):
+    """
+    Prévision du modèle complet depuis le feature store (None si le médecin n'a pas
+    d'historique); la révision du médecin dans la clé invalide le cache à chaque ingestion
+    """
+    feature_store = feature_history.store
+    if doctor_id not in feature_store:
+        return None
+    return _cached_forecast(
+        ('history', doctor_id, feature_store.doctor_revision(doctor_id)),
+        lambda start, days: feature_store.forecast_matrix(doctor_id, bundle.label_encoders, start, days),
+        horizon, bundle
+    )
+
+
+def _forecast_horizon(value):
+    """
+    Horizon demandé, borné à [1, MAX_FORECAST_HORIZON]; valeur absente ou non
+    numérique: horizon par défaut (comme request.args.get(..., type=int))
+    """
+    try:
+        horizon = int(value)
+    except (TypeError, ValueError):
+        return FORECAST_HORIZON
+    return min(max(1, horizon), MAX_FORECAST_HORIZON)
+
+
+def _parse_route_limits(value):
+    """'/api/predict/all=2,/api/predict/batch=2' -> {route: limite}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        route, _, limit = item.rpartition('=')
+        limits[route] = int(limit)
+    return limits
+
+
+# Pool borné pour les routes de prédiction: au-delà de la file ou de la limite
+# d'une route, réponse 503 immédiate avec Retry-After (gunicorn.conf.py dimensionne
+# threads au-dessus de INFERENCE_QUEUE_LIMIT, sinon la file n'est jamais pleine)
+INFERENCE_WORKERS, INFERENCE_QUEUE_LIMIT = inference_settings(os.environ)
+INFERENCE_ROUTE_LIMITS = _parse_route_limits(os.environ.get(
+    'DOCTOR_MODEL_ROUTE_LIMITS', '/api/predict/all=2,/api/predict/batch=2'
+))
+# Budget par défaut d'une requête (remplacé par l'en-tête X-Request-Timeout-Ms)
+REQUEST_TIMEOUT_MS = int(os.environ.get('DOCTOR_MODEL_REQUEST_TIMEOUT_MS', 10000))
+RETRY_AFTER_SECONDS = os.environ.get('DOCTOR_MODEL_RETRY_AFTER', '1')
+
+inference_pool = InferencePool(INFERENCE_WORKERS, INFERENCE_QUEUE_LIMIT, INFERENCE_ROUTE_LIMITS)
+metrics.callback(
+    'inference_queue_depth', 'Tâches de prédiction en attente ou en cours', 'gauge', ('state',),
+    lambda: {('queued',): inference_pool.queued, ('running',): inference_pool.running}
+)
+inference_rejections = metrics.counter(
+    'inference_rejected_total', 'Requêtes refusées par le pool de prédiction', ('route', 'reason')
+)
+
+
+def _request_deadline():
+    """Échéance de la requête (time.monotonic), d'après X-Request-Timeout-Ms ou le budget par défaut"""
+    timeout_ms = request.headers.get('X-Request-Timeout-Ms', type=int) or REQUEST_TIMEOUT_MS
+    return clock.monotonic() + timeout_ms / 1000.0
+
+
+def inference_route(view):
+    """Exécute la route dans le pool de prédiction (503 + Retry-After en cas de surcharge)"""
+    
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        route = request.url_rule.rule
+        try:
+            return inference_pool.run(
+                route, copy_current_request_context(view), *args, deadline=_request_deadline(), **kwargs
+            )
+        except (InferencePoolFull, DeadlineExceeded) as e:
+            reason = 'deadline' if isinstance(e, DeadlineExceeded) else 'overloaded'
+            inference_rejections.inc(route=route, reason=reason)
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = RETRY_AFTER_SECONDS
+            return response, 503
+    
+    return wrapper
 print("✅ Modèles chargés avec succès!")
 
 @app.route('/api/predict/doctor/<int:doctor_id>', methods=['GET'])
+@inference_route
 def predict_doctor_activity(doctor_id):
     """Prédit l'activité d'un médecin spécifique"""
     
     try:
         # Récupérer les données du médecin
-        doctor_data = doctor_profiles[doctor_profiles['doctor_id'] == doctor_id]
+        bundle = registry.active
+        store = bundle.profile_store
+        row = store.row(doctor_id)
         
-        if doctor_data.empty:
+        if row is None:
             return jsonify({'error': 'Médecin non trouvé'}), 404
         
-        # Préparer les features pour la prédiction
-        # (À adapter selon vos features réelles)
-        features = doctor_data[[
-            'avg_consultation_time', 'popularity_score',
-            'actual_consultations', 'is_weekend'
-        ]].values[0]
+        # Prédire pour les prochains jours (7 par défaut, ?horizon=N)
+        horizon = _forecast_horizon(request.args.get('horizon', type=int))
+        if _uses_feature_store(bundle):
+            predictions = _store_forecast(doctor_id, horizon, bundle)
+            if predictions is None:
+                return jsonify({'error': 'Historique du médecin non trouvé'}), 404
+        else:
+            # Préparer les features pour la prédiction (is_weekend est fixé jour par jour)
+            features = store.features[row, :len(BASE_FEATURES)]
+            predictions = _cached_forecast(
+                ('doctor', doctor_id), lambda start, days: _base_rows(features, days), horizon, bundle
+            )
         
-        # Prédire pour les 7 prochains jours
-        predictions = []
-        for day in range(7):
-            # Ajuster les features selon le jour
-            day_features = features.copy()
-            day_features[3] = 1 if day >= 5 else 0  # weekend
-            
-            # Scaling
-            features_scaled = scaler.transform([day_features])
-            
-            # Prédiction
-            pred = activity_predictor.predict(features_scaled)[0]
-            
-            predictions.append({
-                'day': (datetime.now() + timedelta(days=day)).strftime('%Y-%m-%d'),
-                'day_name': (datetime.now() + timedelta(days=day)).strftime('%A'),
-                'predicted_consultations': int(pred)
+        with metrics.stage('json_encoding'):
+            return jsonify({
+                'doctor_id': doctor_id,
+                'predictions': predictions,
+                'confidence': 0.85  # Score de confiance
             })
         
-        return jsonify({
-            'doctor_id': doctor_id,
-            'predictions': predictions,
-            'confidence': 0.85  # Score de confiance
-        })
-        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/predict/doctor-features', methods=['POST'])
+@inference_route
 def predict_doctor_activity_from_features():
     """Pr??dit l'activit?? ?? partir de features fournies par le backend."""
     try:
@@ -91,84 +448,87 @@ def predict_doctor_activity_from_features():
         if not doctor_id:
             return jsonify({'error': 'doctor_id manquant'}), 400
 
-        predictions = []
-        for day in range(7):
-            is_weekend = 1 if day >= 5 else 0
-            pred = _predict_from_features(features, is_weekend=is_weekend)
-            predictions.append({
-                'day': (datetime.now() + timedelta(days=day)).strftime('%Y-%m-%d'),
-                'day_name': (datetime.now() + timedelta(days=day)).strftime('%A'),
-                'predicted_consultations': int(pred)
-            })
+        bundle = registry.active
+        horizon = _forecast_horizon(data.get('horizon'))
+        if _uses_feature_store(bundle):
+            # Modèle complet: les features envoyées ne suffisent pas, historique du feature store
+            predictions = _store_forecast(int(doctor_id), horizon, bundle)
+            if predictions is None:
+                return jsonify({'error': 'Historique du médecin non trouvé'}), 404
+        else:
+            values = _feature_values(features)
+            predictions = _cached_forecast(
+                ('features', tuple(values)), lambda start, days: _base_rows(values, days), horizon, bundle
+            )
 
-        return jsonify({
-            'doctor_id': doctor_id,
-            'predictions': predictions,
-            'confidence': 0.85
-        })
+        with metrics.stage('json_encoding'):
+            return jsonify({
+                'doctor_id': doctor_id,
+                'predictions': predictions,
+                'confidence': 0.85
+            })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/predict/all', methods=['GET'])
+@inference_route
 def predict_all_doctors():
-    """Prédit l'activité de tous les médecins"""
+    """Prédit l'activité de tous les médecins (table en cache, ETag sur le contenu)"""
     
     try:
-        all_predictions = []
-        
-        for _, doctor in doctor_profiles.iterrows():
-            # Prédiction simple
-            features = doctor[[
-                'avg_consultation_time', 'popularity_score',
-                'actual_consultations', 'is_weekend'
-            ]].values.reshape(1, -1)
-            
-            features_scaled = scaler.transform(features)
-            pred = activity_predictor.predict(features_scaled)[0]
-            
-            all_predictions.append({
-                'doctor_id': int(doctor['doctor_id']),
-                'specialty': doctor['specialty'],
-                'predicted_daily_avg': int(pred),
-                'cluster': int(doctor.get('cluster', 0))
-            })
-        
-        return jsonify({
-            'total_doctors': len(all_predictions),
-            'predictions': all_predictions,
-            'generated_at': datetime.now().isoformat()
-        })
+        body, etag = _get_prediction_table()
+        response = Response(_stamp_generated_at(body), mimetype='application/json')
+        response.set_etag(etag)
+        return response.make_conditional(request)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/predict/batch', methods=['POST'])
+@inference_route
 def predict_batch():
-    """Pr??dit l'activit?? journali??re moyenne pour une liste de m??decins."""
+    """Prédit l'activité journalière moyenne pour une liste de médecins (une seule matrice)"""
     try:
         data = request.get_json(silent=True) or {}
         doctors = data.get('doctors') or []
-
-        all_predictions = []
-        for doctor in doctors:
-            doctor_id = doctor.get('doctor_id')
-            features = doctor.get('features') or {}
-            specialty = doctor.get('specialty') or ''
-
-            pred = _predict_from_features(features, is_weekend=0)
-            all_predictions.append({
-                'doctor_id': doctor_id,
-                'specialty': specialty,
-                'predicted_daily_avg': int(pred),
+        
+        if not isinstance(doctors, list):
+            return jsonify({'error': 'doctors must be a list'}), 400
+        if len(doctors) > MAX_BATCH_DOCTORS:
+            return jsonify({'error': f'too many doctors (max {MAX_BATCH_DOCTORS})'}), 413
+        
+        bundle = registry.active
+        if _uses_feature_store(bundle):
+            matrix, invalid = _store_feature_matrix(doctors, bundle)
+            error = 'unknown doctor history'
+        else:
+            matrix, invalid = _batch_feature_matrix(doctors)
+            error = 'invalid features'
+        if invalid:
+            return jsonify({
+                'error': error,
+                'invalid_indices': invalid
+            }), 400
+        
+        preds = _predict_chunked(matrix, bundle=bundle).astype(int).tolist() if doctors else []
+        
+        all_predictions = [
+            {
+                'doctor_id': doctor.get('doctor_id'),
+                'specialty': doctor.get('specialty') or '',
+                'predicted_daily_avg': pred,
                 'cluster': 0
-            })
+            }
+            for doctor, pred in zip(doctors, preds)
+        ]
 
-        return jsonify({
-            'total_doctors': len(all_predictions),
-            'predictions': all_predictions,
-            'generated_at': datetime.now().isoformat()
-        })
+        with metrics.stage('json_encoding'):
+            return jsonify({
+                'total_doctors': len(all_predictions),
+                'predictions': all_predictions,
+                'generated_at': datetime.now().isoformat()
+            })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -177,19 +537,17 @@ def get_cluster_info(cluster_id):
     """Récupère les informations sur un cluster de médecins"""
     
     try:
-        cluster_doctors = doctor_profiles[doctor_profiles['cluster'] == cluster_id]
+        stats = registry.active.profile_store.cluster(cluster_id)
         
-        if cluster_doctors.empty:
+        if stats is None:
             return jsonify({'error': 'Cluster non trouvé'}), 404
         
-        specialties = cluster_doctors['specialty'].value_counts().to_dict()
-        
         return jsonify({
             'cluster_id': cluster_id,
-            'size': len(cluster_doctors),
-            'specialties': specialties,
-            'avg_consultations': float(cluster_doctors['actual_consultations'].mean()),
-            'doctors': cluster_doctors[['doctor_id', 'specialty']].to_dict('records')
+            'size': stats['size'],
+            'specialties': stats['specialties'],
+            'avg_consultations': stats['avg_consultations'],
+            'doctors': stats['doctors']
         })
         
     except Exception as e:
@@ -197,56 +555,55 @@ def get_cluster_info(cluster_id):
 
 @app.route('/api/recommendations/doctor/<int:doctor_id>', methods=['GET'])
 def get_doctor_recommendations(doctor_id):
-    """Génère des recommandations pour un médecin"""
+    """Retourne les recommandations d'un médecin (précalculées au chargement des profils)"""
     
     try:
-        doctor_data = doctor_profiles[doctor_profiles['doctor_id'] == doctor_id]
+        result = registry.active.recommendation_table.for_doctor(doctor_id)
         
-        if doctor_data.empty:
+        if result is None:
             return jsonify({'error': 'Médecin non trouvé'}), 404
         
-        doctor = doctor_data.iloc[0]
-        cluster = int(doctor['cluster'])
-        
-        # Recommandations basées sur le cluster
-        recommendations = []
+        with metrics.stage('json_encoding'):
+            return jsonify(result)
         
-        if doctor['popularity_score'] < 0.5:
-            recommendations.append({
-                'type': 'popularity',
-                'title': 'Augmenter la visibilité',
-                'description': 'Envisagez d\'activer les consultations en ligne pour attirer plus de patients'
-            })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/recommendations/doctors', methods=['POST'])
+def get_doctors_recommendations():
+    """
+    Recommandations pour une liste de médecins
+    Body: {"doctor_ids": [1, 2, 3]}
+    """
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        doctor_ids = data.get('doctor_ids')
         
-        if doctor['emergencies'] > doctor_profiles['emergencies'].mean():
-            recommendations.append({
-                'type': 'emergency',
-                'title': 'Optimiser les urgences',
-                'description': 'Vous avez plus d\'urgences que la moyenne. Prévoyez des créneaux dédiés.'
-            })
+        if not isinstance(doctor_ids, list) or not all(
+            isinstance(doctor_id, int) and not isinstance(doctor_id, bool) for doctor_id in doctor_ids
+        ):
+            return jsonify({'error': 'doctor_ids must be a list of integers'}), 400
+        if len(doctor_ids) > MAX_BATCH_DOCTORS:
+            return jsonify({'error': f'too many doctors (max {MAX_BATCH_DOCTORS})'}), 413
         
-        cluster_avg = doctor_profiles[doctor_profiles['cluster'] == cluster]['actual_consultations'].mean()
-        if doctor['actual_consultations'] < cluster_avg * 0.8:
-            recommendations.append({
-                'type': 'activity',
-                'title': 'Augmenter l\'activité',
-                'description': f'Votre activité est inférieure à la moyenne de votre cluster. Essayez d\'ouvrir plus de créneaux en soirée.'
-            })
+        table = registry.active.recommendation_table
+        results = []
+        not_found = []
+        for doctor_id in doctor_ids:
+            result = table.for_doctor(doctor_id)
+            if result is None:
+                not_found.append(doctor_id)
+            else:
+                results.append(result)
         
-        # Ajouter une recommandation par défaut si nécessaire
-        if not recommendations:
-            recommendations.append({
-                'type': 'general',
-                'title': 'Maintenir le cap',
-                'description': 'Votre activité est dans la moyenne. Continuez ainsi !'
+        with metrics.stage('json_encoding'):
+            return jsonify({
+                'total_doctors': len(results),
+                'recommendations': results,
+                'not_found': not_found
             })
         
-        return jsonify({
-            'doctor_id': doctor_id,
-            'cluster': cluster,
-            'recommendations': recommendations
-        })
-        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -257,8 +614,134 @@ def health_check():
         'status': 'ok',
         'message': 'API de prédiction médicale opérationnelle',
         'models_loaded': True,
+        'model_version': registry.active.version,
+        'models_mmap': registry.mmap,
+        'models_compiled': registry.active.compiled is not None,
+        'feature_store': {
+            'doctors': len(feature_history.store),
+            'revision': feature_history.store.revision,
+            'full_model': _uses_feature_store(registry.active)
+        },
+        'forecast_cache': forecast_cache.stats(),
+        'micro_batching': batcher.stats(),
+        'inference_pool': inference_pool.stats(),
+        'worker_memory': _process_memory(),
         'timestamp': datetime.now().isoformat()
     })
 
+
+def _process_memory():
+    """
+    Mémoire du worker courant d'après /proc (Linux): RSS totale, part partagée avec
+    d'autres processus (pages des modèles mappés ou héritées du fork) et PSS
+    """
+    memory = {'pid': os.getpid()}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line and not line.startswith(' '))
+        kb = {name: int(value.split()[0]) for name, value in fields.items() if value.strip().endswith('kB')}
+        memory['rss_mb'] = round(kb.get('Rss', 0) / 1024, 1)
+        memory['shared_mb'] = round((kb.get('Shared_Clean', 0) + kb.get('Shared_Dirty', 0)) / 1024, 1)
+        memory['pss_mb'] = round(kb.get('Pss', 0) / 1024, 1)
+    except (OSError, ValueError):
+        try:
+            # Noyaux sans smaps_rollup: /proc/self/statm (en pages)
+            with open('/proc/self/statm') as f:
+                _, resident, shared = (int(value) for value in f.read().split()[:3])
+            page_mb = os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+            memory['rss_mb'] = round(resident * page_mb, 1)
+            memory['shared_mb'] = round(shared * page_mb, 1)
+        except (OSError, ValueError):
+            pass
+    return memory
+
+def _check_admin_token():
+    """None si le jeton d'administration est valide, sinon la réponse d'erreur"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'admin endpoints are disabled'}), 403
+    token = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({'error': 'invalid admin token'}), 401
+    return None
+
+@app.route('/api/admin/models', methods=['GET'])
+def models_status():
+    """Version active, historique et état du dernier chargement"""
+    error = _check_admin_token()
+    if error:
+        return error
+    return jsonify(registry.status())
+
+@app.route('/api/admin/models/reload', methods=['POST'])
+def reload_models():
+    """
+    Charge un bundle en arrière-plan puis l'active s'il passe la prédiction de contrôle;
+    les autres workers le chargent à leur tour à leur prochaine requête
+    Body (optionnel): {"version": "2024-06-01"} -> models/saved_models/versions/2024-06-01
+    """
+    error = _check_admin_token()
+    if error:
+        return error
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        if not registry.reload(data.get('version')):
+            return jsonify({'error': 'a reload is already in progress'}), 409
+        return jsonify({'status': 'loading', 'active_version': registry.active.version}), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/models/rollback', methods=['POST'])
+def rollback_models():
+    """Réactive le bundle précédent (dans tous les workers, via le marqueur partagé)"""
+    error = _check_admin_token()
+    if error:
+        return error
+    
+    try:
+        bundle = registry.rollback()
+        if bundle is None:
+            return jsonify({'error': 'no previous version to roll back to'}), 409
+        return jsonify({'status': 'ok', 'active_version': bundle.version})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/features/ingest', methods=['POST'])
+def ingest_features():
+    """
+    Ajoute des journées d'activité à l'historique des features (jours dans l'ordre par médecin),
+    visibles par tous les workers
+    Body: {"records": [{"doctor_id": 3, "date": "2024-06-01", "actual_consultations": 18,
+                        "specialty": "Cardiologie", "hour_8_10": 0.3, ...}]}
+    """
+    error = _check_admin_token()
+    if error:
+        return error
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        records = data.get('records')
+        if not isinstance(records, list):
+            return jsonify({'error': 'records must be a list'}), 400
+        
+        # Spécialités vérifiées contre les encoders du modèle complet actif
+        bundle = registry.active
+        label_encoders = bundle.label_encoders if _uses_feature_store(bundle) else None
+        
+        ingested, errors = feature_history.append(records, label_encoders)
+        
+        return jsonify({
+            'ingested': ingested,
+            'errors': errors,
+            'revision': feature_history.store.revision
+        }), 200 if ingested or not errors else 400
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
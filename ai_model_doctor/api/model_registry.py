@@ -0,0 +1,470 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: pas de verrou entre processus (serveur de développement)
+    fcntl = None
+
+import joblib
+import numpy as np
+
+from profile_store import DoctorProfileStore
+from recommendations import RecommendationTable
+from tree_compiler import COMPILED_FILENAME, CompiledEnsemble, compile_ensemble, sample_inputs, verify
+
+# Fichiers d'un bundle de modèles (produits par models/train_activity_model.py)
+MODEL_FILES = {
+    'activity_predictor': 'activity_predictor.pkl',
+    'scaler': 'scaler.pkl',
+    'label_encoders': 'label_encoders.pkl',
+    'clustering_model': 'clustering_model.pkl',
+    'clustering_scaler': 'clustering_scaler.pkl'
+}
+PROFILES_FILENAME = 'doctor_profiles.csv'
+VERSION_FILENAME = 'VERSION'
+# Version active partagée par tous les workers (écrite par reload/rollback, suivie par sync)
+ACTIVE_MARKER_FILENAME = 'ACTIVE.json'
+
+# Noms de versions acceptés par l'endpoint d'administration (sous-dossiers de versions/)
+VERSION_NAME_PATTERN = re.compile(r'^[A-Za-z0-9._-]+$')
+
+
+class ModelLoadError(Exception):
+    """Le bundle n'a pas pu être chargé ou n'a pas passé la prédiction de contrôle"""
+
+
+class ModelBundle:
+    """
+    Modèles, profils et structures dérivées d'une version donnée.
+
+    Une requête lit le bundle actif une seule fois et l'utilise jusqu'au bout: un
+    remplacement pendant son traitement ne la concerne pas. Les caches dérivés des
+    modèles (table /api/predict/all...) vivent dans le bundle et disparaissent avec lui.
+    """
+
+    def __init__(self, models_dir: str, models: Dict[str, Any], profile_store: DoctorProfileStore,
+                 version: str, profiles_mtime: Optional[float] = None,
+                 compiled: Optional[CompiledEnsemble] = None):
+        self.models_dir = models_dir
+        self.activity_predictor = models['activity_predictor']
+        self.scaler = models['scaler']
+        self.label_encoders = models['label_encoders']
+        self.clustering_model = models['clustering_model']
+        self.clustering_scaler = models['clustering_scaler']
+        # Modèle d'activité compilé (scaler replié), utilisé par predict() s'il existe
+        self.compiled = compiled
+        self.profile_store = profile_store
+        self.recommendation_table = RecommendationTable(profile_store)
+        self.version = version
+        self.profiles_mtime = profiles_mtime
+        self.loaded_at = datetime.now().isoformat()
+        # Nom de la version demandée (sous-dossier de versions/, None pour models_dir)
+        self.source: Optional[str] = None
+
+        self._derived: Dict[Hashable, Any] = {}
+        self._derived_lock = threading.Lock()
+
+    @property
+    def profiles_file(self) -> str:
+        return os.path.join(self.models_dir, PROFILES_FILENAME)
+
+    def _models(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in MODEL_FILES}
+
+    def with_profiles(self, profile_store: DoctorProfileStore, profiles_mtime: float) -> 'ModelBundle':
+        """Même modèles, nouveaux profils (les caches dérivés repartent de zéro)"""
+        bundle = ModelBundle(self.models_dir, self._models(), profile_store, self.version, profiles_mtime,
+                             self.compiled)
+        bundle.source = self.source
+        return bundle
+
+    @property
+    def key(self) -> Tuple[Optional[str], str]:
+        """Identifiant dans le marqueur partagé: (version demandée, version du contenu)"""
+        return self.source, self.version
+
+    def derived(self, key: Hashable, factory: Callable[['ModelBundle'], Any]) -> Any:
+        """Structure calculée une seule fois par bundle (factory(bundle) au premier appel)"""
+        value = self._derived.get(key)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = self._derived[key] = factory(self)
+        return value
+
+    def predict(self, rows) -> np.ndarray:
+        """Prédit des features brutes (modèle compilé si disponible)"""
+        if self.compiled is not None:
+            return self.compiled.predict(rows)
+        return self.predict_original(rows)
+
+    def predict_original(self, rows) -> np.ndarray:
+        return self.activity_predictor.predict(self.scaler.transform(rows))
+
+
+def bundle_version(models_dir: str) -> str:
+    """Contenu du fichier VERSION s'il existe, sinon empreinte des fichiers du bundle"""
+    version_file = os.path.join(models_dir, VERSION_FILENAME)
+    if os.path.exists(version_file):
+        with open(version_file, encoding='utf-8') as f:
+            version = f.read().strip()
+        if version:
+            return version
+
+    digest = hashlib.sha256()
+    for filename in sorted(MODEL_FILES.values()) + [PROFILES_FILENAME]:
+        with open(os.path.join(models_dir, filename), 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def load_compiled(models_dir: str, model, scaler) -> CompiledEnsemble:
+    """
+    activity_predictor.npz s'il est à jour (écrit par save_models ou models/tree_compiler.py),
+    sinon compilation en mémoire depuis le modèle chargé
+    """
+    compiled_file = os.path.join(models_dir, COMPILED_FILENAME)
+    model_file = os.path.join(models_dir, MODEL_FILES['activity_predictor'])
+    if os.path.exists(compiled_file) and os.stat(compiled_file).st_mtime >= os.stat(model_file).st_mtime:
+        return CompiledEnsemble.load(compiled_file)
+    return compile_ensemble(model, scaler)
+
+
+def load_bundle(models_dir: str, mmap: bool = False, compiled: bool = True) -> ModelBundle:
+    """
+    Charge un bundle complet et le valide par une prédiction de contrôle.
+
+    mmap: les tableaux NumPy des modèles (noeuds des arbres, paramètres des scalers)
+    sont mappés en lecture seule depuis les fichiers au lieu d'être copiés: des
+    workers forkés (ou lancés séparément) partagent alors les mêmes pages mémoire.
+    Sans effet sur les fichiers compressés et les boosters XGBoost (octets bruts).
+
+    compiled: prédictions par le modèle compilé (models/tree_compiler.py), après
+    vérification de son équivalence avec le modèle d'origine; repli sur le modèle
+    d'origine si le type de modèle n'est pas pris en charge ou si elle échoue.
+    """
+    try:
+        version = bundle_version(models_dir)
+        models = {
+            name: joblib.load(os.path.join(models_dir, filename), mmap_mode='r' if mmap else None)
+            for name, filename in MODEL_FILES.items()
+        }
+        profiles_file = os.path.join(models_dir, PROFILES_FILENAME)
+        profiles_mtime = os.stat(profiles_file).st_mtime
+        profile_store = DoctorProfileStore.from_csv(profiles_file)
+        bundle = ModelBundle(models_dir, models, profile_store, version, profiles_mtime)
+    except Exception as e:
+        raise ModelLoadError(f'cannot load bundle from {models_dir}: {e}') from e
+
+    smoke_test(bundle)
+    if compiled:
+        bundle.compiled = _checked_compiled(bundle)
+    return bundle
+
+
+def _checked_compiled(bundle: ModelBundle) -> Optional[CompiledEnsemble]:
+    """Modèle compilé vérifié sur les profils et des lignes aléatoires, None sinon"""
+    try:
+        compiled = load_compiled(bundle.models_dir, bundle.activity_predictor, bundle.scaler)
+        rows = sample_inputs(bundle.scaler, compiled.n_features, n_samples=500)
+        if bundle.profile_store.size and bundle.profile_store.features.shape[1] == compiled.n_features:
+            rows = np.vstack([bundle.profile_store.features, rows])
+        report = verify(bundle.activity_predictor, bundle.scaler, compiled, rows)
+    except Exception as e:
+        print(f"⚠️ Modèle compilé indisponible, modèle d'origine utilisé: {e}")
+        return None
+    if not report['ok']:
+        print(f"⚠️ Modèle compilé non équivalent ({report}), modèle d'origine utilisé")
+        return None
+    return compiled
+
+
+def smoke_test(bundle: ModelBundle):
+    """Prédit un profil connu (ou une ligne neutre) et vérifie que le résultat est exploitable"""
+    n_features = getattr(bundle.scaler, 'n_features_in_', None)
+    if n_features not in (None, bundle.profile_store.features.shape[1]):
+        # Modèle complet (features du feature store): ligne autour de la distribution d'entraînement
+        rows = sample_inputs(bundle.scaler, n_features, n_samples=1)
+    elif bundle.profile_store.size:
+        rows = bundle.profile_store.features[:1]
+    else:
+        rows = np.array([[30.0, 0.5, 0.0, 0.0]])
+    try:
+        preds = np.asarray(bundle.predict_original(rows), dtype=np.float64)
+    except Exception as e:
+        raise ModelLoadError(f'smoke prediction failed: {e}') from e
+    if preds.shape != (len(rows),) or not np.all(np.isfinite(preds)):
+        raise ModelLoadError(f'smoke prediction returned an invalid result: {preds!r}')
+
+
+class ModelRegistry:
+    """
+    Bundle de modèles actif et historique pour le retour arrière.
+
+    Les nouveaux bundles sont chargés dans un thread à part puis substitués en une
+    seule affectation; en cas d'échec l'ancien reste actif. Un seul chargement à la fois.
+
+    Plusieurs workers: reload et rollback écrivent la version active et son historique
+    dans un marqueur partagé (models_dir/ACTIVE.json); chaque worker le surveille par
+    sync() (un os.stat par requête) et charge ou réactive la même version, sans redémarrage.
+    """
+
+    def __init__(self, models_dir: str, history_size: int = 3, mmap: bool = False, compiled: bool = True,
+                 marker_file: Optional[str] = None):
+        self.models_dir = models_dir
+        self.mmap = mmap
+        self.compiled = compiled
+        self.history_size = history_size
+        self.marker_file = marker_file or os.path.join(models_dir, ACTIVE_MARKER_FILENAME)
+        self.loading = False
+        self.last_error: Optional[str] = None
+        self._history: 'deque[ModelBundle]' = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._listeners = []
+
+        # Démarrage: version du marqueur s'il existe (redémarrage après un reload)
+        self._marker_stamp = self._stat_marker()
+        marker = self._read_marker() or {}
+        self.generation = marker.get('generation', 0)
+        try:
+            self._active = self._load(marker.get('source'))
+        except (ModelLoadError, ValueError) as e:
+            if marker.get('source') is None:
+                raise
+            print(f"⚠️ Version {marker['source']} du marqueur inutilisable, modèles par défaut: {e}")
+            self._active = self._load(None)
+
+    @property
+    def active(self) -> ModelBundle:
+        return self._active
+
+    def on_swap(self, listener: Callable[[ModelBundle], None]):
+        """Appelé après chaque changement de bundle (vider des caches externes...)"""
+        self._listeners.append(listener)
+
+    def _swap(self, bundle: ModelBundle, keep_previous: bool = True):
+        previous = self._active
+        if keep_previous:
+            self._history.append(previous)
+        self._active = bundle
+        for listener in self._listeners:
+            listener(bundle)
+
+    def resolve(self, version: Optional[str] = None) -> str:
+        """Dossier d'une version (models_dir/versions/<version>), models_dir par défaut"""
+        if version is None:
+            return self.models_dir
+        if not isinstance(version, str) or not VERSION_NAME_PATTERN.match(version) or version in ('.', '..'):
+            raise ValueError(f'invalid version name: {version!r}')
+        models_dir = os.path.join(self.models_dir, 'versions', version)
+        if not os.path.isdir(models_dir):
+            raise ValueError(f'unknown version: {version}')
+        return models_dir
+
+    def _load(self, source: Optional[str]) -> ModelBundle:
+        bundle = load_bundle(self.resolve(source), self.mmap, self.compiled)
+        bundle.source = source
+        return bundle
+
+    def _stat_marker(self) -> Optional[Tuple[int, int]]:
+        """(inode, mtime) du marqueur: os.replace crée un nouvel inode à chaque écriture"""
+        try:
+            stat = os.stat(self.marker_file)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _read_marker(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.marker_file, encoding='utf-8') as f:
+                marker = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return marker if isinstance(marker, dict) else None
+
+    @contextmanager
+    def _marker_lock(self):
+        """Verrou entre processus pour lire-modifier-écrire le marqueur"""
+        with open(self.marker_file + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _publish(self, bundle: ModelBundle, previous: List[Dict[str, Any]], generation: int):
+        """Écrit le marqueur (remplacement atomique) pour que les autres workers suivent"""
+        marker = {
+            'generation': generation + 1,
+            'source': bundle.source,
+            'version': bundle.version,
+            'previous': previous[:self.history_size],
+            'updated_at': datetime.now().isoformat()
+        }
+        temporary_path = f"{self.marker_file}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(marker, f)
+        os.replace(temporary_path, self.marker_file)
+        self.generation = marker['generation']
+        self._marker_stamp = self._stat_marker()
+
+    def _take_from_history(self, key: Tuple[Optional[str], str]) -> Optional[ModelBundle]:
+        """Retire de l'historique local le bundle correspondant au marqueur, None s'il n'y est pas"""
+        for bundle in self._history:
+            if bundle.key == key:
+                self._history.remove(bundle)
+                return bundle
+        return None
+
+    def reload(self, version: Optional[str] = None, background: bool = True) -> bool:
+        """
+        Charge le bundle demandé, l'active et le publie dans le marqueur.
+        Retourne False si un chargement est déjà en cours.
+        """
+        self.resolve(version)
+        with self._lock:
+            if self.loading:
+                return False
+            self.loading = True
+
+        if background:
+            threading.Thread(target=self._load_and_swap, args=(version,), daemon=True).start()
+        else:
+            self._load_and_swap(version)
+        return True
+
+    def _load_and_swap(self, source: Optional[str], publish: bool = True):
+        try:
+            bundle = self._load(source)
+            if publish:
+                with self._marker_lock():
+                    marker = self._read_marker() or {}
+                    current = {'source': self._active.source, 'version': self._active.version}
+                    with self._lock:
+                        self._swap(bundle)
+                        self.last_error = None
+                    self._publish(bundle, [current] + marker.get('previous', []), marker.get('generation', 0))
+            else:
+                with self._lock:
+                    self._swap(bundle)
+                    self.last_error = None
+            print(f"✅ Modèles version {bundle.version} activés")
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️ Rechargement des modèles ignoré: {e}")
+        finally:
+            self.loading = False
+
+    def rollback(self) -> Optional[ModelBundle]:
+        """
+        Réactive la version précédente du marqueur (dans tous les workers), None s'il
+        n'y en a pas. Le bundle est repris de l'historique local s'il y est, sinon rechargé.
+        """
+        with self._marker_lock():
+            marker = self._read_marker() or {}
+            previous = marker.get('previous') or []
+            if not previous:
+                return None
+            target = previous[0]
+            key = (target.get('source'), target.get('version'))
+            with self._lock:
+                bundle = self._take_from_history(key)
+            if bundle is None:
+                bundle = self._load(target.get('source'))
+            with self._lock:
+                self._swap(bundle, keep_previous=False)
+            self._publish(bundle, previous[1:], marker.get('generation', 0))
+        print(f"↩️ Retour aux modèles version {bundle.version}")
+        return bundle
+
+    def sync(self) -> bool:
+        """
+        Suit le marqueur partagé: réactive la version publiée par un autre worker
+        (depuis l'historique local, ou chargée en arrière-plan). Un os.stat si inchangé.
+        """
+        stamp = self._stat_marker()
+        if stamp == self._marker_stamp:
+            return False
+
+        with self._lock:
+            if self.loading or stamp == self._marker_stamp:
+                return False
+            self._marker_stamp = stamp
+            marker = self._read_marker()
+            if marker is None or marker.get('generation') == self.generation:
+                return False
+            self.generation = marker.get('generation', 0)
+            key = (marker.get('source'), marker.get('version'))
+            if self._active.key == key:
+                return False
+            bundle = self._take_from_history(key)
+            if bundle is not None:
+                self._swap(bundle)
+                print(f"🔁 Modèles version {bundle.version} réactivés (marqueur partagé)")
+                return True
+            self.loading = True
+
+        threading.Thread(target=self._load_and_swap, args=(key[0], False), daemon=True).start()
+        return True
+
+    def watch(self, interval: float = 1.0):
+        """Thread de fond qui appelle sync() toutes les `interval` secondes (workers sans trafic)"""
+        def poll():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"⚠️ Lecture du marqueur de version impossible: {e}")
+
+        threading.Thread(target=poll, daemon=True).start()
+
+    def refresh_profiles(self) -> bool:
+        """Relit doctor_profiles.csv du bundle actif si le fichier a été modifié"""
+        bundle = self._active
+        try:
+            mtime = os.stat(bundle.profiles_file).st_mtime
+        except OSError:
+            return False
+        if mtime == bundle.profiles_mtime:
+            return False
+
+        with self._lock:
+            if self._active is not bundle or self.loading:
+                return False
+            try:
+                store = DoctorProfileStore.from_csv(bundle.profiles_file)
+            except (OSError, ValueError, KeyError) as e:
+                # Un fichier invalide n'est signalé qu'une fois par modification
+                bundle.profiles_mtime = mtime
+                print(f"⚠️ Rechargement des profils ignoré: {e}")
+                return False
+            self._swap(bundle.with_profiles(store, mtime), keep_previous=False)
+        print("🔄 Profils des médecins rechargés")
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        bundle = self._active
+        return {
+            'version': bundle.version,
+            'loaded_at': bundle.loaded_at,
+            'models_dir': bundle.models_dir,
+            'compiled': bundle.compiled.kind if bundle.compiled is not None else None,
+            'loading': self.loading,
+            'last_error': self.last_error,
+            'generation': self.generation,
+            'history': [previous.version for previous in reversed(self._history)]
+        }
@@ -0,0 +1,79 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Colonnes utilisées par le modèle d'activité, dans l'ordre attendu par le scaler
+MODEL_FEATURES = ('avg_consultation_time', 'popularity_score', 'actual_consultations', 'is_weekend')
+
+
+class DoctorProfileStore:
+    """
+    Profils des médecins indexés une fois au chargement de doctor_profiles.csv.
+
+    - index doctor_id -> rang (première occurrence, comme un filtre + iloc[0])
+    - tableaux NumPy contigus des features du modèle et des colonnes utilisées par les règles
+    - statistiques par cluster (taille, spécialités, moyennes, liste des médecins)
+    Les routes lisent ces structures en O(1) au lieu de filtrer le DataFrame.
+    """
+
+    def __init__(self, profiles: pd.DataFrame):
+        self.profiles = profiles
+        self.size = len(profiles)
+
+        self.doctor_ids = profiles['doctor_id'].to_numpy(dtype=np.int64)
+        self.specialties: List[Any] = profiles['specialty'].tolist()
+        self.features = np.ascontiguousarray(profiles[list(MODEL_FEATURES)].to_numpy(dtype=np.float64))
+        self.popularity = self.features[:, 1]
+        self.consultations = self.features[:, 2]
+        self.emergencies = self._column('emergencies', np.float64)
+        self.clusters = self._column('cluster', np.int64)
+
+        self.index: Dict[int, int] = {}
+        for row, doctor_id in enumerate(self.doctor_ids.tolist()):
+            self.index.setdefault(doctor_id, row)
+
+        self.emergencies_mean = float(self.emergencies.mean()) if self.size else float('nan')
+        self.cluster_stats: Dict[int, Dict[str, Any]] = self._build_cluster_stats()
+
+        # Moyenne de consultations du cluster de chaque médecin (pour les règles vectorisées)
+        self.cluster_consultations = np.array(
+            [self.cluster_stats[cluster]['avg_consultations'] for cluster in self.clusters.tolist()],
+            dtype=np.float64
+        )
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'DoctorProfileStore':
+        return cls(pd.read_csv(path))
+
+    def _column(self, name: str, dtype) -> np.ndarray:
+        """Colonne optionnelle du CSV (0 si absente)"""
+        if name in self.profiles:
+            return self.profiles[name].to_numpy(dtype=dtype)
+        return np.zeros(self.size, dtype=dtype)
+
+    def _build_cluster_stats(self) -> Dict[int, Dict[str, Any]]:
+        stats = {}
+        for cluster in np.unique(self.clusters).tolist():
+            rows = np.flatnonzero(self.clusters == cluster)
+            specialties: Dict[Any, int] = {}
+            for row in rows.tolist():
+                specialties[self.specialties[row]] = specialties.get(self.specialties[row], 0) + 1
+            stats[cluster] = {
+                'size': len(rows),
+                'specialties': specialties,
+                'avg_consultations': float(self.consultations[rows].mean()),
+                'doctors': [
+                    {'doctor_id': int(self.doctor_ids[row]), 'specialty': self.specialties[row]}
+                    for row in rows.tolist()
+                ]
+            }
+        return stats
+
+    def row(self, doctor_id: int) -> Optional[int]:
+        """Rang du médecin dans le store, None s'il est inconnu"""
+        return self.index.get(doctor_id)
+
+    def cluster(self, cluster_id: int) -> Optional[Dict[str, Any]]:
+        """Statistiques précalculées du cluster, None s'il est vide"""
+        return self.cluster_stats.get(cluster_id)
@@ -0,0 +1,85 @@
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+from profile_store import DoctorProfileStore
+
+
+class RecommendationRule(NamedTuple):
+    """
+    Règle de recommandation: condition évaluée d'un coup sur tous les médecins du store
+    (tableau booléen, une valeur par médecin) et message associé.
+    """
+    type: str
+    title: str
+    description: str
+    condition: Callable[[DoctorProfileStore], np.ndarray]
+
+
+# Règles évaluées dans l'ordre; ajouter une règle = ajouter une entrée ici
+RULES = (
+    RecommendationRule(
+        'popularity',
+        'Augmenter la visibilité',
+        'Envisagez d\'activer les consultations en ligne pour attirer plus de patients',
+        lambda store: store.popularity < 0.5
+    ),
+    RecommendationRule(
+        'emergency',
+        'Optimiser les urgences',
+        'Vous avez plus d\'urgences que la moyenne. Prévoyez des créneaux dédiés.',
+        lambda store: store.emergencies > store.emergencies_mean
+    ),
+    RecommendationRule(
+        'activity',
+        'Augmenter l\'activité',
+        'Votre activité est inférieure à la moyenne de votre cluster. Essayez d\'ouvrir plus de créneaux en soirée.',
+        lambda store: store.consultations < store.cluster_consultations * 0.8
+    ),
+)
+
+# Recommandation par défaut quand aucune règle ne s'applique
+DEFAULT_RECOMMENDATION = {
+    'type': 'general',
+    'title': 'Maintenir le cap',
+    'description': 'Votre activité est dans la moyenne. Continuez ainsi !'
+}
+
+
+class RecommendationTable:
+    """
+    Recommandations de tous les médecins, calculées une fois par version des profils.
+
+    Les listes sont partagées entre les réponses: elles ne doivent pas être modifiées.
+    """
+
+    def __init__(self, store: DoctorProfileStore, rules: Iterable[RecommendationRule] = RULES):
+        self.store = store
+        self.rules = tuple(rules)
+
+        messages = [
+            {'type': rule.type, 'title': rule.title, 'description': rule.description}
+            for rule in self.rules
+        ]
+        if self.rules:
+            matches = np.column_stack([
+                np.asarray(rule.condition(store), dtype=bool) for rule in self.rules
+            ])
+        else:
+            matches = np.zeros((store.size, 0), dtype=bool)
+
+        self.by_row: List[List[Dict[str, str]]] = [
+            [messages[index] for index in np.flatnonzero(row).tolist()] or [DEFAULT_RECOMMENDATION]
+            for row in matches
+        ]
+
+    def for_doctor(self, doctor_id: int) -> Optional[Dict[str, Any]]:
+        """Recommandations d'un médecin, None s'il est inconnu"""
+        row = self.store.row(doctor_id)
+        if row is None:
+            return None
+        return {
+            'doctor_id': doctor_id,
+            'cluster': int(self.store.clusters[row]),
+            'recommendations': self.by_row[row]
+        }
@@ -0,0 +1,60 @@
+# gunicorn.conf.py
+#
+# Lancement multi-workers de l'API de prédiction (depuis ai_model_doctor/):
+#     gunicorn -c gunicorn.conf.py
+#
+# preload_app: les modèles et les profils sont chargés une seule fois dans le
+# processus maître, puis les workers sont forkés et partagent ces pages en
+# lecture (copy-on-write). Avec DOCTOR_MODEL_MMAP=1 (défaut), les tableaux NumPy
+# des modèles sont en plus mappés depuis les fichiers .pkl.
+#
+# /api/admin/models/reload et /rollback écrivent la version active dans
+# models_dir/ACTIVE.json: chaque worker vérifie ce marqueur (mtime) avant chaque
+# requête et toutes les DOCTOR_MODEL_SYNC_INTERVAL secondes, et charge la même
+# version en arrière-plan, sans redémarrage. Un nouveau maître (redémarrage,
+# USR2) démarre aussi sur la version du marqueur.
+#
+# threads et pool de prédiction: les routes de prédiction passent par un pool borné
+# (DOCTOR_MODEL_INFERENCE_WORKERS threads de calcul, DOCTOR_MODEL_INFERENCE_QUEUE
+# tâches en attente ou en cours au plus) qui répond 503 + Retry-After quand il est
+# plein. Chaque requête occupe un thread gunicorn: avec threads <= la file du pool,
+# les requêtes en trop attendent dans le backlog de gunicorn, la file n'est jamais
+# pleine et le 503 jamais renvoyé. threads vaut donc par défaut la file du pool plus
+# DOCTOR_MODEL_EXTRA_THREADS (health, metrics, admin et réponses 503), et le
+# démarrage échoue si DOCTOR_MODEL_THREADS ne dépasse pas la file.
+
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+from inference_pool import inference_settings
+
+wsgi_app = 'model_api:app'
+pythonpath = 'api'
+bind = os.environ.get('DOCTOR_MODEL_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('DOCTOR_MODEL_WORKERS', 4))
+_, inference_queue_limit = inference_settings(os.environ)
+threads = int(os.environ.get(
+    'DOCTOR_MODEL_THREADS', inference_queue_limit + int(os.environ.get('DOCTOR_MODEL_EXTRA_THREADS', 4))
+))
+if threads <= inference_queue_limit:
+    raise RuntimeError(
+        f'DOCTOR_MODEL_THREADS={threads} must exceed DOCTOR_MODEL_INFERENCE_QUEUE={inference_queue_limit}, '
+        'otherwise the inference pool never rejects requests with 503'
+    )
+preload_app = True
+timeout = 60
+
+
+def pre_fork(server, worker):
+    # Les objets chargés dans le maître ne seront plus parcourus par le ramasse-miettes
+    # des workers, qui sinon écrirait dans leurs en-têtes et dupliquerait les pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Suivi du marqueur de version même sans requête (thread propre à chaque worker)
+    import model_api
+    model_api.registry.watch(float(os.environ.get('DOCTOR_MODEL_SYNC_INTERVAL', 1.0)))
+    server.log.info("Worker %s prêt (modèles hérités du maître)", worker.pid)
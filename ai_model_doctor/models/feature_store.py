@@ -0,0 +1,465 @@
+# models/feature_store.py
+"""
+Features du modèle d'activité, communes à l'entraînement et à l'API.
+
+- FEATURE_COLUMNS: les 23 colonnes dans l'ordre vu par le scaler et le modèle
+- calendar_features(): encodages du calendrier (jour, mois, saison, cycliques)
+- FeatureStore: historique récent de chaque médecin dans des buffers circulaires;
+  rolling_7d, rolling_30d et trend sont mis à jour en O(1) à chaque nouveau jour
+  et le vecteur complet est construit à la demande, sans relire l'historique.
+- FeatureHistory: FeatureStore adossé à un CSV append-only partagé par les workers.
+
+Les moyennes mobiles suivent MedicalActivityPredictor._add_rolling_features:
+moyenne des 7 (30) derniers jours enregistrés, jour courant inclus, et
+trend = consultations du jour - rolling_7d.
+
+Limite pour les jours futurs: rolling_7d, rolling_30d et trend restent figés au
+dernier jour enregistré. Seules les features du calendrier suivent le jour demandé.
+À l'entraînement, ces moyennes incluent le jour cible et trend contient ses propres
+consultations; une prévision (forecast_matrix) ou /api/predict/all, qui utilise
+le calendrier d'aujourd'hui, voit donc un état plus ancien, parfois de plusieurs
+jours si l'historique n'a pas été alimenté. La parité avec l'entraînement n'est
+exacte que pour le dernier jour enregistré (tests/test_feature_store.py).
+"""
+
+import csv
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: pas de verrou entre processus (serveur de développement)
+    fcntl = None
+
+# Fenêtres des moyennes mobiles (en jours enregistrés)
+ROLLING_SHORT = 7
+ROLLING_LONG = 30
+
+NUMERIC_FEATURES = [
+    'day_of_week', 'month', 'is_weekend', 'is_holiday',
+    'avg_consultation_time', 'popularity_score',
+    'has_online_consultations', 'day_of_month', 'week_of_year',
+    'quarter', 'day_sin', 'day_cos', 'month_sin', 'month_cos',
+    'rolling_7d', 'rolling_30d', 'trend'
+]
+CATEGORICAL_FEATURES = ['specialty', 'season']
+HOURLY_FEATURES = ['hour_8_10', 'hour_10_12', 'hour_14_16', 'hour_16_18']
+
+FEATURE_COLUMNS = (
+    NUMERIC_FEATURES
+    + [col + '_encoded' for col in CATEGORICAL_FEATURES]
+    + HOURLY_FEATURES
+)
+
+# Caractéristiques fixes d'un médecin (reprises du dernier enregistrement reçu)
+STATIC_FEATURES = ('specialty', 'avg_consultation_time', 'popularity_score', 'has_online_consultations')
+# Champs optionnels d'un enregistrement journalier, en plus de doctor_id, date et actual_consultations
+RECORD_FIELDS = STATIC_FEATURES + tuple(HOURLY_FEATURES)
+# Colonnes d'un fichier d'historique créé par FeatureHistory (sous-ensemble de synthetic_consultations.csv)
+HISTORY_COLUMNS = ['date', 'doctor_id', 'specialty', 'day_of_week', 'month', 'is_weekend', 'is_holiday',
+                   'actual_consultations'] + [name for name in RECORD_FIELDS if name != 'specialty']
+
+
+def get_season(month: int) -> str:
+    """Détermine la saison"""
+    if month in [12, 1, 2]:
+        return 'hiver'
+    elif month in [3, 4, 5]:
+        return 'printemps'
+    elif month in [6, 7, 8]:
+        return 'ete'
+    else:
+        return 'automne'
+
+
+def calendar_features(day: date) -> Dict[str, Any]:
+    """Features calendaires d'un jour, identiques à celles de load_and_prepare_data"""
+    day_of_week = day.weekday()
+    return {
+        'day_of_week': day_of_week,
+        'month': day.month,
+        'is_weekend': int(day_of_week >= 5),
+        'day_of_month': day.day,
+        'week_of_year': day.isocalendar()[1],
+        'quarter': (day.month - 1) // 3 + 1,
+        'day_sin': np.sin(2 * np.pi * day_of_week / 7),
+        'day_cos': np.cos(2 * np.pi * day_of_week / 7),
+        'month_sin': np.sin(2 * np.pi * day.month / 12),
+        'month_cos': np.cos(2 * np.pi * day.month / 12),
+        'season': get_season(day.month)
+    }
+
+
+def encode_label(encoder, value: str) -> int:
+    """Équivalent de LabelEncoder.transform pour une seule valeur (classes_ est trié)"""
+    classes = encoder.classes_
+    index = int(np.searchsorted(classes, value))
+    if index >= len(classes) or classes[index] != value:
+        raise ValueError(f'unknown label: {value!r}')
+    return index
+
+
+def _present(value: Any) -> bool:
+    """Valeur renseignée (ni None ni NaN des lignes CSV incomplètes)"""
+    return value is not None and value == value
+
+
+def _number(value: Any, name: str) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number') from None
+    if not np.isfinite(number):
+        raise ValueError(f'{name} must be finite')
+    return number
+
+
+def parse_record(record: Any) -> Tuple[int, date, float, Dict[str, Any]]:
+    """
+    (doctor_id, jour, consultations, champs) d'un enregistrement journalier (JSON ou ligne
+    CSV); les champs absents ou vides sont omis. ValueError si l'enregistrement est invalide.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('record must be an object')
+    missing = [name for name in ('doctor_id', 'date', 'actual_consultations')
+               if not _present(record.get(name)) or record.get(name) == '']
+    if missing:
+        raise ValueError(f'missing field(s): {", ".join(missing)}')
+
+    doctor_id = _number(record['doctor_id'], 'doctor_id')
+    if doctor_id != int(doctor_id):
+        raise ValueError('doctor_id must be an integer')
+    try:
+        day = date.fromisoformat(str(record['date'])[:10])
+    except ValueError:
+        raise ValueError(f'invalid date: {record["date"]!r}') from None
+
+    fields = {}
+    for name in RECORD_FIELDS:
+        value = record.get(name)
+        if not _present(value) or value == '':
+            continue
+        fields[name] = str(value) if name == 'specialty' else _number(value, name)
+    if 'has_online_consultations' in fields:
+        fields['has_online_consultations'] = int(fields['has_online_consultations'])
+    return int(doctor_id), day, _number(record['actual_consultations'], 'actual_consultations'), fields
+
+
+class RollingWindow:
+    """Moyenne des `size` dernières valeurs (buffer circulaire, somme tenue à jour)"""
+
+    __slots__ = ('values', 'total', 'count', 'position')
+
+    def __init__(self, size: int):
+        self.values = np.zeros(size, dtype=np.float64)
+        self.total = 0.0
+        self.count = 0
+        self.position = 0
+
+    def push(self, value: float):
+        size = len(self.values)
+        if self.count == size:
+            self.total -= self.values[self.position]
+        else:
+            self.count += 1
+        self.values[self.position] = value
+        self.total += value
+        self.position = (self.position + 1) % size
+
+    def replace_last(self, value: float):
+        """Corrige la dernière valeur (même jour reçu une seconde fois)"""
+        last = (self.position - 1) % len(self.values)
+        self.total += value - self.values[last]
+        self.values[last] = value
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class DoctorState:
+    """Historique récent et caractéristiques d'un médecin"""
+
+    __slots__ = ('static', 'hourly', 'short', 'long', 'last_day', 'last_value', 'revision')
+
+    def __init__(self):
+        self.static: Dict[str, Any] = {}
+        self.hourly: Dict[str, float] = {name: 0.0 for name in HOURLY_FEATURES}
+        self.short = RollingWindow(ROLLING_SHORT)
+        self.long = RollingWindow(ROLLING_LONG)
+        self.last_day: Optional[date] = None
+        self.last_value = 0.0
+        self.revision = 0
+
+
+class FeatureStore:
+    """
+    Features en ligne par médecin, alimentées jour par jour (ingest) et lues par l'API.
+
+    Chaque processus (worker) a son propre store: FeatureHistory le garde identique
+    dans tous les workers à partir d'un fichier d'historique commun.
+    """
+
+    def __init__(self, revision: int = 0):
+        self._doctors: Dict[int, DoctorState] = {}
+        self._lock = threading.Lock()
+        # Compteur global: un store qui en remplace un autre repart de sa révision
+        self.revision = revision
+
+    def __contains__(self, doctor_id: int) -> bool:
+        return doctor_id in self._doctors
+
+    def __len__(self) -> int:
+        return len(self._doctors)
+
+    def doctor_ids(self):
+        return list(self._doctors)
+
+    def doctor_revision(self, doctor_id: int) -> int:
+        """Change à chaque mise à jour du médecin (pour les clés de cache)"""
+        state = self._doctors.get(doctor_id)
+        return state.revision if state is not None else -1
+
+    def ingest(self, doctor_id: int, day: date, actual_consultations: float,
+               label_encoders: Optional[Dict[str, Any]] = None, **fields):
+        """
+        Enregistre les consultations d'un jour. Les jours d'un médecin arrivent dans
+        l'ordre; le même jour reçu à nouveau remplace la valeur précédente.
+        fields: RECORD_FIELDS, caractéristiques fixes et distribution horaire (None: inchangé).
+        label_encoders: si fourni, la spécialité doit être connue de l'encoder de l'entraînement.
+        Un enregistrement refusé (ValueError) ne modifie rien.
+        """
+        value = float(actual_consultations)
+        with self._lock:
+            state = self._doctors.get(doctor_id)
+            if state is None:
+                missing = [name for name in STATIC_FEATURES if not _present(fields.get(name))]
+                if missing:
+                    raise ValueError(f'doctor {doctor_id}: new doctor requires {", ".join(missing)}')
+            elif day < state.last_day:
+                raise ValueError(f'doctor {doctor_id}: {day} is before the last recorded day {state.last_day}')
+            if label_encoders is not None:
+                specialty = fields['specialty'] if _present(fields.get('specialty')) else state.static['specialty']
+                try:
+                    encode_label(label_encoders['specialty'], str(specialty))
+                except ValueError:
+                    raise ValueError(f'doctor {doctor_id}: unknown specialty {specialty!r}') from None
+
+            if state is None:
+                state = self._doctors[doctor_id] = DoctorState()
+            if day == state.last_day:
+                state.short.replace_last(value)
+                state.long.replace_last(value)
+            else:
+                state.short.push(value)
+                state.long.push(value)
+            state.last_day = day
+            state.last_value = value
+
+            for name in STATIC_FEATURES:
+                if _present(fields.get(name)):
+                    state.static[name] = fields[name]
+            for name in HOURLY_FEATURES:
+                if _present(fields.get(name)):
+                    state.hourly[name] = float(fields[name])
+
+            self.revision += 1
+            state.revision = self.revision
+
+    def record_fields(self, doctor_id: int) -> Dict[str, Any]:
+        """Caractéristiques fixes et distribution horaire courantes d'un médecin (RECORD_FIELDS)"""
+        state = self._doctors[doctor_id]
+        fields = dict(state.static)
+        fields.update(state.hourly)
+        return fields
+
+    def features(self, doctor_id: int, day: Optional[date] = None, is_holiday: int = 0) -> Dict[str, Any]:
+        """
+        Features d'un médecin pour `day` (par défaut le dernier jour enregistré):
+        calendrier du jour demandé, moyennes mobiles de l'état courant (figées au
+        dernier jour enregistré pour un jour ultérieur, voir la docstring du module).
+        """
+        state = self._doctors.get(doctor_id)
+        if state is None:
+            raise KeyError(doctor_id)
+
+        missing = [name for name in STATIC_FEATURES if name not in state.static]
+        if missing:
+            raise ValueError(f'doctor {doctor_id}: missing {", ".join(missing)}')
+
+        rolling_7d = state.short.mean()
+        features = calendar_features(day or state.last_day)
+        features.update(state.static)
+        features.update(state.hourly)
+        features.update({
+            'is_holiday': int(is_holiday),
+            'has_online_consultations': int(state.static['has_online_consultations']),
+            'rolling_7d': rolling_7d,
+            'rolling_30d': state.long.mean(),
+            'trend': state.last_value - rolling_7d
+        })
+        return features
+
+    def vector(self, doctor_id: int, label_encoders: Dict[str, Any], day: Optional[date] = None,
+               is_holiday: int = 0) -> np.ndarray:
+        """Vecteur de FEATURE_COLUMNS, catégories encodées avec les encoders de l'entraînement"""
+        features = self.features(doctor_id, day, is_holiday)
+        for col in CATEGORICAL_FEATURES:
+            features[col + '_encoded'] = encode_label(label_encoders[col], str(features[col]))
+        return np.array([float(features[name]) for name in FEATURE_COLUMNS], dtype=np.float64)
+
+    def forecast_matrix(self, doctor_id: int, label_encoders: Dict[str, Any], start: date,
+                        horizon: int) -> np.ndarray:
+        """Une ligne de FEATURE_COLUMNS par jour à partir de `start` (état courant du médecin)"""
+        return np.vstack([
+            self.vector(doctor_id, label_encoders, start + timedelta(days=offset))
+            for offset in range(horizon)
+        ])
+
+
+class FeatureHistory:
+    """
+    FeatureStore adossé à un CSV append-only (format de synthetic_consultations.csv)
+    partagé par tous les workers.
+
+    - append(): valide et ingère des enregistrements puis les ajoute au fichier
+      (verrou fcntl entre processus): ils survivent aux redémarrages
+    - refresh(): ingère les lignes ajoutées par les autres workers depuis la dernière
+      lecture (un os.stat si le fichier n'a pas changé)
+    Les lignes sont appliquées dans l'ordre du fichier, comme les moyennes mobiles de
+    l'entraînement. Un fichier remplacé (nouvel inode ou plus court) est relu en entier.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.store = FeatureStore()
+        self._offset = 0
+        self._header: Optional[List[str]] = None
+        self._stamp = None
+        # Fichier déjà lu (inode, octets lus y compris une ligne incomplète): détection
+        # d'un remplacement indépendante de _stamp, remis à None après une ligne incomplète
+        self._inode: Optional[int] = None
+        self._read_size = 0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    @contextmanager
+    def _file_lock(self):
+        """Verrou entre processus pour rattraper puis compléter le fichier"""
+        with open(self.path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reset(self):
+        self.store = FeatureStore(self.store.revision)
+        self._offset = 0
+        self._header = None
+        self._stamp = None
+        self._inode = None
+        self._read_size = 0
+
+    def refresh(self) -> int:
+        """Ingère les lignes ajoutées au fichier depuis la dernière lecture; retourne leur nombre"""
+        if self._stat() == self._stamp:
+            return 0
+        with self._lock:
+            return self._read_new_lines()
+
+    def _read_new_lines(self) -> int:
+        """Lit les lignes complètes après _offset (appelé sous _lock)"""
+        stamp = self._stat()
+        if stamp is None or stamp == self._stamp:
+            return 0
+        if self._inode is not None and (stamp[0] != self._inode or stamp[1] < self._read_size):
+            print("🔄 Historique des features remplacé, relecture complète")
+            self._reset()
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Une ligne en cours d'écriture (sans fin de ligne) sera lue au prochain appel
+        end = data.rfind(b'\n') + 1
+        self._stamp = stamp if end == len(data) else None
+        self._inode = stamp[0]
+        self._read_size = self._offset + len(data)
+        lines = data[:end].decode('utf-8').splitlines()
+        self._offset += end
+
+        if self._header is None and lines:
+            self._header = next(csv.reader([lines[0]]))
+            lines = lines[1:]
+
+        count = 0
+        for row in csv.reader(lines):
+            try:
+                doctor_id, day, consultations, fields = parse_record(dict(zip(self._header, row)))
+                self.store.ingest(doctor_id, day, consultations, **fields)
+                count += 1
+            except ValueError as e:
+                print(f"⚠️ Ligne d'historique ignorée: {e}")
+        return count
+
+    def append(self, records: List[Any], label_encoders: Optional[Dict[str, Any]] = None):
+        """
+        Valide et ingère les enregistrements (dans l'ordre), puis ajoute les valides au fichier.
+        Retourne (nombre ingéré, [{'index', 'error'}] des enregistrements refusés).
+        """
+        with self._lock, self._file_lock():
+            # Rattraper les autres workers avant de valider l'ordre des jours
+            self._read_new_lines()
+
+            rows, errors = [], []
+            for index, record in enumerate(records):
+                try:
+                    doctor_id, day, consultations, fields = parse_record(record)
+                    self.store.ingest(doctor_id, day, consultations, label_encoders=label_encoders, **fields)
+                except ValueError as e:
+                    errors.append({'index': index, 'error': str(e)})
+                    continue
+                # Ligne complète (champs omis repris de l'état du médecin), utilisable pour l'entraînement
+                row = calendar_features(day)
+                row.update(self.store.record_fields(doctor_id))
+                row.update({'date': day.isoformat(), 'doctor_id': doctor_id,
+                            'actual_consultations': consultations, 'is_holiday': 0})
+                rows.append(row)
+
+            if rows:
+                try:
+                    self._write(rows)
+                except OSError:
+                    # Le store ne doit pas s'écarter du fichier: relecture complète
+                    self._reset()
+                    self._read_new_lines()
+                    raise
+            return len(rows), errors
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        """Ajoute les lignes au fichier (en-tête HISTORY_COLUMNS s'il est créé) et avance _offset"""
+        with open(self.path, 'a', newline='', encoding='utf-8') as f:
+            if f.tell() == 0:
+                self._header = HISTORY_COLUMNS
+                csv.writer(f).writerow(self._header)
+            elif self._header is None:
+                self._header = HISTORY_COLUMNS
+            writer = csv.DictWriter(f, fieldnames=self._header, extrasaction='ignore')
+            writer.writerows(rows)
+        stamp = self._stat()
+        self._offset = self._read_size = stamp[1]
+        self._inode = stamp[0]
+        self._stamp = stamp
@@ -8,6 +8,9 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import xgboost as xgb
 import joblib
+import os
+from tree_compiler import COMPILED_FILENAME, compile_ensemble, sample_inputs, verify
+from feature_store import CATEGORICAL_FEATURES, FEATURE_COLUMNS, ROLLING_LONG, ROLLING_SHORT, get_season
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -50,15 +53,8 @@ class MedicalActivityPredictor:
         return df
     
     def _get_season(self, month):
-        """Détermine la saison"""
-        if month in [12, 1, 2]:
-            return 'hiver'
-        elif month in [3, 4, 5]:
-            return 'printemps'
-        elif month in [6, 7, 8]:
-            return 'ete'
-        else:
-            return 'automne'
+        """Détermine la saison (partagé avec l'API via feature_store)"""
+        return get_season(month)
     
     def _add_rolling_features(self, df):
         """Ajoute des moyennes mobiles pour capturer les tendances"""
@@ -68,11 +64,11 @@ class MedicalActivityPredictor:
             
             # Moyenne mobile sur 7 jours
             df.loc[mask, 'rolling_7d'] = df.loc[mask, 'actual_consultations']\
-                .rolling(window=7, min_periods=1).mean()
+                .rolling(window=ROLLING_SHORT, min_periods=1).mean()
             
             # Moyenne mobile sur 30 jours
             df.loc[mask, 'rolling_30d'] = df.loc[mask, 'actual_consultations']\
-                .rolling(window=30, min_periods=1).mean()
+                .rolling(window=ROLLING_LONG, min_periods=1).mean()
             
             # Tendance (différence avec la moyenne)
             df.loc[mask, 'trend'] = df.loc[mask, 'actual_consultations'] - \
@@ -83,34 +79,17 @@ class MedicalActivityPredictor:
     def prepare_features(self, df):
         """Prépare les features pour l'entraînement"""
         
-        # Features numériques
-        numeric_features = [
-            'day_of_week', 'month', 'is_weekend', 'is_holiday',
-            'avg_consultation_time', 'popularity_score',
-            'has_online_consultations', 'day_of_month', 'week_of_year',
-            'quarter', 'day_sin', 'day_cos', 'month_sin', 'month_cos',
-            'rolling_7d', 'rolling_30d', 'trend'
-        ]
-        
-        # Features catégorielles
-        categorical_features = ['specialty', 'season']
-        
         # Encoder les features catégorielles
-        for col in categorical_features:
+        for col in CATEGORICAL_FEATURES:
             if col not in self.label_encoders:
                 self.label_encoders[col] = LabelEncoder()
                 df[col + '_encoded'] = self.label_encoders[col].fit_transform(df[col].astype(str))
             else:
                 df[col + '_encoded'] = self.label_encoders[col].transform(df[col].astype(str))
-            
-            numeric_features.append(col + '_encoded')
         
-        # Features pour la distribution horaire
-        hourly_features = ['hour_8_10', 'hour_10_12', 'hour_14_16', 'hour_16_18']
-        numeric_features.extend(hourly_features)
-        
-        # Sélectionner les features
-        X = df[numeric_features].fillna(0)
+        # Sélectionner les features (numériques, catégorielles encodées, distribution
+        # horaire), dans l'ordre de FEATURE_COLUMNS partagé avec l'API
+        X = df[FEATURE_COLUMNS].fillna(0)
         
         # Target
         y = df['actual_consultations']
@@ -258,17 +237,39 @@ class MedicalActivityPredictor:
         self.best_model = grid_search.best_estimator_
         return grid_search.best_params_
     
+    @staticmethod
+    def _dump_atomic(obj, path):
+        """
+        Écrit dans un fichier temporaire puis le renomme: l'API qui a chargé
+        l'ancienne version en mémoire mappée garde un fichier intact
+        """
+        tmp_path = f"{path}.tmp"
+        joblib.dump(obj, tmp_path)
+        os.replace(tmp_path, path)
+    
     def save_models(self):
         """Sauvegarde les modèles entraînés"""
         
         # Sauvegarder le meilleur modèle
-        joblib.dump(self.best_model, 'models/saved_models/activity_predictor.pkl')
+        self._dump_atomic(self.best_model, 'models/saved_models/activity_predictor.pkl')
         
         # Sauvegarder le scaler
-        joblib.dump(self.scaler, 'models/saved_models/scaler.pkl')
+        self._dump_atomic(self.scaler, 'models/saved_models/scaler.pkl')
         
         # Sauvegarder les encoders
-        joblib.dump(self.label_encoders, 'models/saved_models/label_encoders.pkl')
+        self._dump_atomic(self.label_encoders, 'models/saved_models/label_encoders.pkl')
+        
+        # Version compilée du meilleur modèle (scaler replié), servie par l'API
+        try:
+            compiled = compile_ensemble(self.best_model, self.scaler)
+            report = verify(self.best_model, self.scaler, compiled,
+                            sample_inputs(self.scaler, compiled.n_features))
+            if report['ok']:
+                compiled.save(f'models/saved_models/{COMPILED_FILENAME}')
+            else:
+                print(f"⚠️ Modèle compilé non équivalent, non sauvegardé: {report}")
+        except ValueError as e:
+            print(f"⚠️ Compilation du modèle impossible: {e}")
         
         print("\n💾 Modèles sauvegardés dans 'models/saved_models/'")
     
@@ -0,0 +1,384 @@
+# models/tree_compiler.py
+"""
+Compilation des ensembles d'arbres (RandomForest, GradientBoosting, XGBoost) en
+tableaux NumPy plats, avec le StandardScaler replié dans les seuils de coupure.
+
+La prédiction d'une ligne ne passe plus par sklearn/xgboost: tous les arbres
+sont parcourus ensemble, un niveau par itération.
+
+Usage:
+    python models/tree_compiler.py [models/saved_models]
+    -> compile activity_predictor.pkl + scaler.pkl en activity_predictor.npz
+       et vérifie l'équivalence avec le modèle d'origine
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+# Nom du fichier compilé à côté de activity_predictor.pkl
+COMPILED_FILENAME = 'activity_predictor.npz'
+
+# Écart maximal toléré entre le modèle d'origine et sa version compilée: absolu, plus
+# relatif pour XGBoost qui somme ses feuilles en float32 (cibles de plusieurs milliers)
+DEFAULT_TOLERANCE = 1e-3
+DEFAULT_RELATIVE_TOLERANCE = 1e-4
+
+_ARRAY_FIELDS = ('feature', 'threshold', 'left', 'right', 'missing', 'value', 'roots')
+
+
+class CompiledEnsemble:
+    """
+    Ensemble d'arbres sous forme de tableaux de noeuds concaténés.
+
+    Un noeud interne i va vers left[i] si X[:, feature[i]] <= threshold[i] (seuil
+    exprimé dans l'espace des features brutes, avant scaling), sinon vers right[i]
+    (missing[i] si la valeur est NaN); une feuille a feature = -1 et porte value[i].
+    Prédiction = base + scale * somme des feuilles atteintes.
+    """
+
+    def __init__(self, kind, n_features, feature, threshold, left, right, missing, value, roots,
+                 base=0.0, scale=1.0):
+        self.kind = kind
+        self.n_features = int(n_features)
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.int32)
+        self.right = np.ascontiguousarray(right, dtype=np.int32)
+        self.missing = np.ascontiguousarray(missing, dtype=np.int32)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        self.base = float(base)
+        self.scale = float(scale)
+        self.max_depth = _max_depth(self.feature, self.left, self.right, self.roots)
+
+        # Tableaux de parcours: une feuille boucle sur elle-même (seuil +inf, enfants = elle),
+        # ce qui évite de distinguer feuilles et noeuds internes à chaque niveau
+        leaf = self.feature < 0
+        nodes = np.arange(self.n_nodes, dtype=np.int32)
+        self._walk_feature = np.where(leaf, 0, self.feature).astype(np.intp)
+        self._walk_threshold = np.where(leaf, np.inf, self.threshold)
+        self._walk_left = np.where(leaf, nodes, self.left)
+        self._walk_right = np.where(leaf, nodes, self.right)
+        self._walk_missing = np.where(leaf, nodes, self.missing)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def predict(self, X):
+        """Prédit des features brutes (non scalées), une ligne ou une matrice"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f'X has {X.shape[1]} features, the model expects {self.n_features}')
+
+        # Un noeud courant par (ligne, arbre), à plat; offsets = début de chaque ligne dans X
+        values = np.ascontiguousarray(X).ravel()
+        offsets = np.repeat(np.arange(len(X), dtype=np.intp) * self.n_features, self.n_trees)
+        node = np.tile(self.roots, len(X))
+        has_nan = np.isnan(values).any()
+        for _ in range(self.max_depth):
+            x = values.take(offsets + self._walk_feature.take(node))
+            child = np.where(x <= self._walk_threshold.take(node),
+                             self._walk_left.take(node), self._walk_right.take(node))
+            if has_nan:
+                child = np.where(np.isnan(x), self._walk_missing.take(node), child)
+            node = child
+
+        return self.base + self.scale * self.value.take(node).reshape(len(X), self.n_trees).sum(axis=1)
+
+    def save(self, path):
+        """Écrit le modèle compilé (.npz non compressé), via un fichier temporaire"""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            meta=np.array(json.dumps({
+                'kind': self.kind, 'n_features': self.n_features,
+                'base': self.base, 'scale': self.scale
+            })),
+            **{name: getattr(self, name) for name in _ARRAY_FIELDS}
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            arrays = {name: data[name] for name in _ARRAY_FIELDS}
+        return cls(meta['kind'], meta['n_features'], base=meta['base'], scale=meta['scale'], **arrays)
+
+
+def _max_depth(feature, left, right, roots):
+    """Profondeur maximale (nombre de tests) parmi tous les arbres"""
+    depth = 0
+    level = np.asarray(roots, dtype=np.int64)
+    while len(level):
+        level = level[feature[level] >= 0]
+        if not len(level):
+            break
+        depth += 1
+        level = np.concatenate([left[level], right[level]])
+    return depth
+
+
+def _scaler_params(scaler, n_features):
+    """Moyenne et écart-type du StandardScaler (0 et 1 s'il n'y en a pas)"""
+    if scaler is None:
+        return np.zeros(n_features), np.ones(n_features)
+    mean = getattr(scaler, 'mean_', None)
+    scale = getattr(scaler, 'scale_', None)
+    mean = np.zeros(n_features) if mean is None or not getattr(scaler, 'with_mean', True) else np.asarray(mean, dtype=np.float64)
+    scale = np.ones(n_features) if scale is None or not getattr(scaler, 'with_std', True) else np.asarray(scale, dtype=np.float64)
+    return mean, scale
+
+
+_SIGN_BIT = np.iinfo(np.int64).min
+
+
+def _ordered_keys(x):
+    """Entiers dans le même ordre que les flottants (deux voisins = deux flottants consécutifs)"""
+    bits = np.asarray(x, dtype=np.float64).view(np.int64)
+    return np.where(bits >= 0, bits, -(bits & ~_SIGN_BIT))
+
+
+def _from_ordered_keys(keys):
+    return np.where(keys >= 0, keys, (-keys) | _SIGN_BIT).astype(np.int64).view(np.float64)
+
+
+def fold_thresholds(threshold, mean, scale, strict):
+    """
+    Seuils dans l'espace brut équivalents aux tests du modèle sur les features scalées.
+
+    sklearn et XGBoost convertissent les features scalées en float32 puis testent
+    float32((x - mean) / scale) <= seuil (sklearn) ou < seuil (XGBoost). Cette
+    fonction étant croissante en x, le test équivaut à x <= s, où s est le plus grand
+    flottant qui passe le test: on l'encadre autour de seuil * scale + mean puis on
+    le trouve par dichotomie sur les flottants voisins (résultat exact, pas approché).
+    """
+    def passes(x):
+        scaled = ((x - mean) / scale).astype(np.float32).astype(np.float64)
+        return scaled < threshold if strict else scaled <= threshold
+
+    approx = threshold * scale + mean
+    step = np.abs(approx) * 1e-6 + 1e-9
+
+    low = approx.copy()
+    for _ in range(200):
+        failing = ~passes(low)
+        if not failing.any():
+            break
+        low = np.where(failing, low - step, low)
+        step = np.where(failing, step * 2, step)
+
+    step = np.abs(approx) * 1e-6 + 1e-9
+    high = approx.copy()
+    for _ in range(200):
+        passing = passes(high)
+        if not passing.any():
+            break
+        high = np.where(passing, high + step, high)
+        step = np.where(passing, step * 2, step)
+
+    low_keys, high_keys = _ordered_keys(low), _ordered_keys(high)
+    while True:
+        open_interval = high_keys - low_keys > 1
+        if not open_interval.any():
+            break
+        middle_keys = low_keys + (high_keys - low_keys) // 2
+        middle_passes = passes(_from_ordered_keys(middle_keys))
+        low_keys = np.where(open_interval & middle_passes, middle_keys, low_keys)
+        high_keys = np.where(open_interval & ~middle_passes, middle_keys, high_keys)
+    return _from_ordered_keys(low_keys)
+
+
+class _NodeArrays:
+    """Accumulateur des noeuds de plusieurs arbres (indices absolus)"""
+
+    def __init__(self):
+        self.feature, self.threshold, self.left, self.right = [], [], [], []
+        self.missing, self.value, self.roots = [], [], []
+        self.size = 0
+
+    def add_sklearn_tree(self, tree):
+        offset = self.size
+        self.size += tree.node_count
+        self.roots.append(offset)
+        internal = tree.children_left >= 0
+        self.feature.append(np.where(internal, tree.feature, -1))
+        self.threshold.append(np.where(internal, tree.threshold, 0.0))
+        self.left.append(np.where(internal, tree.children_left + offset, -1))
+        self.right.append(np.where(internal, tree.children_right + offset, -1))
+        # sklearn >= 1.3: direction des valeurs manquantes apprise à l'entraînement
+        missing_left = getattr(tree, 'missing_go_to_left', None)
+        if missing_left is None:
+            missing_left = np.zeros(tree.node_count, dtype=bool)
+        self.missing.append(np.where(
+            internal, np.where(missing_left.astype(bool), tree.children_left, tree.children_right) + offset, -1
+        ))
+        self.value.append(tree.value[:, 0, 0])
+        return self
+
+    def add_xgboost_tree(self, dump, feature_index):
+        """Arbre XGBoost au format get_dump(dump_format='json')"""
+        nodes = {}
+        stack = [dump]
+        while stack:
+            node = stack.pop()
+            nodes[node['nodeid']] = node
+            stack.extend(node.get('children', ()))
+
+        offset = self.size
+        size = max(nodes) + 1
+        self.size += size
+        self.roots.append(offset + dump['nodeid'])
+        feature = np.full(size, -1, dtype=np.int64)
+        threshold = np.zeros(size)
+        left = np.full(size, -1, dtype=np.int64)
+        right = np.full(size, -1, dtype=np.int64)
+        missing = np.full(size, -1, dtype=np.int64)
+        value = np.zeros(size)
+        for nodeid, node in nodes.items():
+            if 'leaf' in node:
+                # Valeurs stockées en float32 par XGBoost: on retrouve la valeur exacte
+                value[nodeid] = float(np.float32(node['leaf']))
+                continue
+            feature[nodeid] = feature_index(node['split'])
+            threshold[nodeid] = float(np.float32(node['split_condition']))
+            left[nodeid] = node['yes'] + offset
+            right[nodeid] = node['no'] + offset
+            missing[nodeid] = node['missing'] + offset
+
+        self.feature.append(feature)
+        self.threshold.append(threshold)
+        self.left.append(left)
+        self.right.append(right)
+        self.missing.append(missing)
+        self.value.append(value)
+        return self
+
+    def build(self, kind, n_features, mean, scale, base, factor, strict):
+        feature = np.concatenate(self.feature)
+        threshold = np.concatenate(self.threshold)
+        internal = feature >= 0
+        # Repli du scaler dans les seuils (voir fold_thresholds)
+        # (un seuil infini, coupure "valeurs manquantes seules" de sklearn, reste infini)
+        folded = internal & np.isfinite(threshold)
+        threshold[folded] = fold_thresholds(
+            threshold[folded], mean[feature[folded]], scale[feature[folded]], strict
+        )
+        return CompiledEnsemble(
+            kind, n_features, feature, threshold,
+            np.concatenate(self.left), np.concatenate(self.right), np.concatenate(self.missing),
+            np.concatenate(self.value), np.array(self.roots), base=base, scale=factor
+        )
+
+
+def _xgboost_base_score(booster):
+    params = json.loads(booster.save_config())['learner']['learner_model_param']
+    return float(params['base_score'].strip('[]'))
+
+
+def compile_ensemble(model, scaler=None):
+    """Compile un RandomForestRegressor, GradientBoostingRegressor ou XGBRegressor"""
+    name = type(model).__name__
+
+    if name == 'RandomForestRegressor':
+        n_features = model.n_features_in_
+        nodes = _NodeArrays()
+        for estimator in model.estimators_:
+            nodes.add_sklearn_tree(estimator.tree_)
+        mean, scale = _scaler_params(scaler, n_features)
+        return nodes.build('random_forest', n_features, mean, scale,
+                           base=0.0, factor=1.0 / len(model.estimators_), strict=False)
+
+    if name == 'GradientBoostingRegressor':
+        n_features = model.n_features_in_
+        if model.init_ == 'zero':
+            base = 0.0
+        elif type(model.init_).__name__ == 'DummyRegressor':
+            base = float(np.ravel(model.init_.constant_)[0])
+        else:
+            raise ValueError(f'unsupported GradientBoosting init estimator: {model.init_!r}')
+        nodes = _NodeArrays()
+        for estimator in model.estimators_[:, 0]:
+            nodes.add_sklearn_tree(estimator.tree_)
+        mean, scale = _scaler_params(scaler, n_features)
+        return nodes.build('gradient_boosting', n_features, mean, scale,
+                           base=base, factor=model.learning_rate, strict=False)
+
+    if name == 'XGBRegressor':
+        booster = model.get_booster()
+        n_features = booster.num_features()
+        names = booster.feature_names
+        positions = {feature: position for position, feature in enumerate(names or ())}
+
+        def feature_index(split):
+            return positions[split] if names else int(split[1:])
+
+        nodes = _NodeArrays()
+        for dump in booster.get_dump(dump_format='json'):
+            nodes.add_xgboost_tree(json.loads(dump), feature_index)
+        mean, scale = _scaler_params(scaler, n_features)
+        return nodes.build('xgboost', n_features, mean, scale,
+                           base=_xgboost_base_score(booster), factor=1.0, strict=True)
+
+    raise ValueError(f'unsupported model type: {name}')
+
+
+def sample_inputs(scaler, n_features, n_samples=2000, seed=42):
+    """Lignes aléatoires autour de la distribution d'entraînement (moyenne ± 3 écarts-types)"""
+    mean, scale = _scaler_params(scaler, n_features)
+    rng = np.random.default_rng(seed)
+    return mean + scale * rng.uniform(-3, 3, size=(n_samples, n_features))
+
+
+def verify(model, scaler, compiled, X, tolerance=DEFAULT_TOLERANCE,
+           relative_tolerance=DEFAULT_RELATIVE_TOLERANCE):
+    """
+    Compare les prédictions du modèle d'origine (scaler + predict) et du modèle compilé:
+    écart accepté si <= tolerance + relative_tolerance * |prédiction d'origine|.
+    Retourne {'samples', 'max_abs_diff', 'mismatches', 'ok'}.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    expected = np.asarray(model.predict(scaler.transform(X) if scaler is not None else X), dtype=np.float64)
+    actual = compiled.predict(X)
+    diff = np.abs(expected - actual)
+    mismatches = int((~np.isclose(actual, expected, rtol=relative_tolerance, atol=tolerance)).sum())
+    return {
+        'samples': len(X),
+        'max_abs_diff': float(diff.max()) if len(diff) else 0.0,
+        'mismatches': mismatches,
+        'ok': mismatches == 0
+    }
+
+
+def compile_saved_models(models_dir='models/saved_models', n_samples=2000):
+    """Compile activity_predictor.pkl + scaler.pkl du dossier, vérifie puis écrit le .npz"""
+    import joblib
+
+    model = joblib.load(os.path.join(models_dir, 'activity_predictor.pkl'))
+    scaler = joblib.load(os.path.join(models_dir, 'scaler.pkl'))
+    compiled = compile_ensemble(model, scaler)
+
+    report = verify(model, scaler, compiled, sample_inputs(scaler, compiled.n_features, n_samples))
+    if not report['ok']:
+        raise ValueError(f'compiled model differs from the original: {report}')
+
+    compiled.save(os.path.join(models_dir, COMPILED_FILENAME))
+    return compiled, report
+
+
+if __name__ == "__main__":
+    models_dir = sys.argv[1] if len(sys.argv) > 1 else 'models/saved_models'
+    compiled, report = compile_saved_models(models_dir)
+    print(f"✅ {compiled.kind}: {compiled.n_trees} arbres, {compiled.n_nodes} noeuds, profondeur {compiled.max_depth}")
+    print(f"   Équivalence: {report['samples']} lignes, écart max {report['max_abs_diff']:.2e}")
+    print(f"💾 Modèle compilé écrit dans '{os.path.join(models_dir, COMPILED_FILENAME)}'")
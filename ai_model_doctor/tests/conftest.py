@@ -0,0 +1,89 @@
+# tests/conftest.py
+"""
+Bundle de modèles minimal (6 médecins, modèles à 4 features) et client Flask de
+api/model_api.py chargé sur ce bundle.
+"""
+
+import importlib
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import KMeans
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from profile_store import MODEL_FEATURES
+
+PROFILES = pd.DataFrame({
+    'doctor_id': [1, 2, 3, 4, 5, 6],
+    'specialty': ['Cardiologue', 'ORL', 'Pédiatre', 'Cardiologue', 'Dermatologue', 'ORL'],
+    'avg_consultation_time': [20, 25, 30, 15, 35, 22],
+    'popularity_score': [0.9, 0.5, 0.7, 0.2, 0.95, 0.4],
+    'actual_consultations': [22.0, 12.0, 15.0, 6.0, 25.0, 10.0],
+    'is_weekend': [0, 0, 0, 0, 0, 0],
+    'emergencies': [1.0, 4.0, 2.0, 0.5, 3.0, 1.5],
+    'cluster': [0, 1, 0, 1, 2, 1]
+})
+
+
+def write_profiles(models_dir, profiles):
+    """Réécrit doctor_profiles.csv avec un mtime strictement plus récent"""
+    path = os.path.join(models_dir, 'doctor_profiles.csv')
+    previous = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    profiles.to_csv(path, index=False)
+    stamp = max(os.stat(path).st_mtime_ns, previous + 1_000_000_000)
+    os.utime(path, ns=(stamp, stamp))
+
+
+@pytest.fixture(scope='session')
+def models_dir(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('saved_models'))
+    rng = np.random.default_rng(0)
+
+    X = rng.uniform([10, 0, 0, 0], [40, 1, 30, 1], size=(300, len(MODEL_FEATURES)))
+    X[:, 3] = np.round(X[:, 3])
+    y = 0.5 * X[:, 2] + 10 * X[:, 1] - 4 * X[:, 3] + rng.normal(scale=0.5, size=len(X))
+    scaler = StandardScaler().fit(X)
+    model = RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0).fit(scaler.transform(X), y)
+
+    clustering_features = rng.uniform(size=(30, 3))
+    clustering_scaler = StandardScaler().fit(clustering_features)
+    clustering_model = KMeans(n_clusters=3, n_init=1, random_state=0).fit(
+        clustering_scaler.transform(clustering_features)
+    )
+
+    for name, value in {
+        'activity_predictor': model,
+        'scaler': scaler,
+        'label_encoders': {},
+        'clustering_model': clustering_model,
+        'clustering_scaler': clustering_scaler
+    }.items():
+        joblib.dump(value, os.path.join(directory, f'{name}.pkl'))
+    write_profiles(directory, PROFILES)
+    return directory
+
+
+@pytest.fixture(scope='session')
+def model_api(models_dir):
+    """Module model_api chargé sur le bundle de test (une fois par session)"""
+    os.environ.update({
+        'DOCTOR_MODEL_DIR': models_dir,
+        'DOCTOR_MODEL_ADMIN_TOKEN': 'test-token',
+        'DOCTOR_MODEL_BATCH_WINDOW_MS': '0'
+    })
+    return importlib.import_module('model_api')
+
+
+@pytest.fixture
+def client(model_api, models_dir):
+    """Client Flask; doctor_profiles.csv est restauré après chaque test"""
+    yield model_api.app.test_client()
+    write_profiles(models_dir, PROFILES)
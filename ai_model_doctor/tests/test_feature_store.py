@@ -0,0 +1,99 @@
+# tests/test_feature_store.py
+"""
+Parité des features en ligne (models/feature_store.py) avec celles de l'entraînement
+(MedicalActivityPredictor.prepare_features) sur un petit jeu synthétique.
+"""
+
+import csv
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'models'))
+sys.path.insert(0, os.path.join(ROOT, 'data'))
+
+from feature_store import FeatureHistory, FeatureStore, parse_record
+from generate_synthetic_data import SyntheticMedicalDataGenerator
+from train_activity_model import MedicalActivityPredictor
+
+
+@pytest.fixture
+def consultations(tmp_path, monkeypatch):
+    """(chemin du CSV synthétique, lignes du CSV, X de prepare_features, label encoders)"""
+    random.seed(0)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    generator = SyntheticMedicalDataGenerator(n_doctors=3, n_days=60)
+    generator.generate_doctors()
+    generator.generate_consultations()
+    generator.save_data()
+    path = str(tmp_path / 'data' / 'synthetic_consultations.csv')
+
+    predictor = MedicalActivityPredictor()
+    X, _ = predictor.prepare_features(predictor.load_and_prepare_data(path))
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    return path, rows, X.to_numpy(dtype=np.float64), predictor.label_encoders
+
+
+def test_ingest_matches_training_features(consultations):
+    _, rows, X, label_encoders = consultations
+    store = FeatureStore()
+
+    # Chaque ligne rejouée dans l'ordre du fichier donne la ligne de X correspondante
+    for expected, row in zip(X, rows):
+        doctor_id, day, actual, fields = parse_record(row)
+        store.ingest(doctor_id, day, actual, label_encoders=label_encoders, **fields)
+        vector = store.vector(doctor_id, label_encoders, day, is_holiday=int(row['is_holiday']))
+        np.testing.assert_allclose(vector, expected, rtol=0, atol=1e-9)
+
+
+def test_history_append_is_seen_by_other_instance(consultations, tmp_path):
+    _, rows, X, label_encoders = consultations
+    path = str(tmp_path / 'feature_history.csv')
+    writer, reader = FeatureHistory(path), FeatureHistory(path)
+
+    count, errors = writer.append(rows, label_encoders)
+    assert (count, errors) == (len(rows), [])
+    assert reader.refresh() == len(rows)
+    assert reader.refresh() == 0
+
+    last_rows = {int(row['doctor_id']): index for index, row in enumerate(rows)}
+    assert sorted(reader.store.doctor_ids()) == sorted(last_rows)
+    for doctor_id, index in last_rows.items():
+        expected = writer.store.vector(doctor_id, label_encoders)
+        np.testing.assert_array_equal(reader.store.vector(doctor_id, label_encoders), expected)
+        # Dernier jour enregistré (jours fériés non conservés par l'historique)
+        vector = reader.store.vector(doctor_id, label_encoders, is_holiday=int(rows[index]['is_holiday']))
+        np.testing.assert_allclose(vector, X[index], rtol=0, atol=1e-9)
+
+
+def _write_history(path, fieldnames, rows, partial=''):
+    """Écrit un historique dans un nouveau fichier (nouvel inode), ligne incomplète en fin"""
+    with open(path + '.tmp', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+        f.write(partial)
+    os.replace(path + '.tmp', path)
+
+
+def test_history_replaced_after_partial_line_is_reread(consultations, tmp_path):
+    _, rows, _, _ = consultations
+    path = str(tmp_path / 'feature_history.csv')
+    fieldnames = list(rows[0])
+    first_doctor = [row for row in rows if row['doctor_id'] == rows[0]['doctor_id']]
+    other_doctor = [row for row in rows if row['doctor_id'] != rows[0]['doctor_id']][:1]
+
+    _write_history(path, fieldnames, first_doctor, partial=','.join(first_doctor[-1].values())[:40])
+    history = FeatureHistory(path)
+    assert history.store.doctor_ids() == [int(rows[0]['doctor_id'])]
+
+    # Fichier remplacé alors que la dernière lecture s'est arrêtée sur une ligne incomplète
+    _write_history(path, fieldnames, other_doctor)
+    assert history.refresh() == 1
+    assert history.store.doctor_ids() == [int(other_doctor[0]['doctor_id'])]
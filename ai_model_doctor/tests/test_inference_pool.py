@@ -0,0 +1,46 @@
+# tests/test_inference_pool.py
+"""Contrôle d'admission: pool de prédiction plein -> 503 + Retry-After"""
+
+import os
+import runpy
+import threading
+
+import pytest
+
+from inference_pool import InferencePool
+
+GUNICORN_CONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gunicorn.conf.py')
+
+
+def test_saturated_pool_returns_503(client, model_api, monkeypatch):
+    pool = InferencePool(workers=1, queue_limit=1)
+    monkeypatch.setattr(model_api, 'inference_pool', pool)
+    release = threading.Event()
+    started = threading.Event()
+
+    def occupy():
+        started.set()
+        release.wait(10)
+
+    busy = threading.Thread(target=pool.run, args=('/busy', occupy))
+    busy.start()
+    try:
+        assert started.wait(5)
+        response = client.get('/api/predict/doctor/1')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == model_api.RETRY_AFTER_SECONDS
+    finally:
+        release.set()
+        busy.join(5)
+
+    assert client.get('/api/predict/doctor/1').status_code == 200
+
+
+def test_gunicorn_threads_exceed_inference_queue(monkeypatch):
+    monkeypatch.delenv('DOCTOR_MODEL_THREADS', raising=False)
+    monkeypatch.setenv('DOCTOR_MODEL_INFERENCE_QUEUE', '16')
+    assert runpy.run_path(GUNICORN_CONF)['threads'] > 16
+
+    monkeypatch.setenv('DOCTOR_MODEL_THREADS', '16')
+    with pytest.raises(RuntimeError, match='DOCTOR_MODEL_INFERENCE_QUEUE'):
+        runpy.run_path(GUNICORN_CONF)
@@ -0,0 +1,53 @@
+# tests/test_model_api.py
+"""Routes de api/model_api.py sur le bundle de test (voir conftest.py)"""
+
+import pandas as pd
+
+from conftest import PROFILES, write_profiles
+
+
+def _with_new_doctor():
+    """PROFILES + un médecin 7 dans un nouveau cluster 3"""
+    doctor = {
+        'doctor_id': 7, 'specialty': 'Neurologue', 'avg_consultation_time': 18,
+        'popularity_score': 0.85, 'actual_consultations': 30.0, 'is_weekend': 0,
+        'emergencies': 6.0, 'cluster': 3
+    }
+    return pd.concat([PROFILES, pd.DataFrame([doctor])], ignore_index=True)
+
+
+def test_all_routes_read_reloaded_profiles(client, models_dir):
+    assert client.get('/api/predict/doctor/7').status_code == 404
+    assert client.get('/api/cluster/3').status_code == 404
+
+    write_profiles(models_dir, _with_new_doctor())
+
+    # Sans passer par /api/predict/all
+    response = client.get('/api/predict/doctor/7')
+    assert response.status_code == 200
+    assert response.get_json()['doctor_id'] == 7
+
+    cluster = client.get('/api/cluster/3').get_json()
+    assert [doctor['doctor_id'] for doctor in cluster['doctors']] == [7]
+
+    doctor_ids = [p['doctor_id'] for p in client.get('/api/predict/all').get_json()['predictions']]
+    assert 7 in doctor_ids
+
+
+def _recommendation_types(result):
+    return [recommendation['type'] for recommendation in result['recommendations']]
+
+
+def test_recommendations_read_reloaded_profiles(client, models_dir):
+    assert _recommendation_types(client.get('/api/recommendations/doctor/1').get_json()) == ['general']
+
+    profiles = _with_new_doctor()
+    profiles.loc[profiles['doctor_id'] == 1, 'popularity_score'] = 0.3
+    write_profiles(models_dir, profiles)
+
+    # Sans passer par /api/predict/all
+    assert _recommendation_types(client.get('/api/recommendations/doctor/1').get_json()) == ['popularity']
+
+    body = client.post('/api/recommendations/doctors', json={'doctor_ids': [1, 7]}).get_json()
+    assert [result['doctor_id'] for result in body['recommendations']] == [1, 7]
+    assert body['not_found'] == []
@@ -0,0 +1,62 @@
+# tests/test_tree_compiler.py
+"""
+Équivalence des modèles compilés (models/tree_compiler.py) avec sklearn/xgboost.
+
+Lancement (depuis ai_model_doctor/):
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+from tree_compiler import compile_ensemble, sample_inputs, verify
+
+
+def _training_data(n_samples=600, n_features=6, seed=0):
+    """Features et cible de l'ordre de plusieurs milliers (cas où XGBoost arrondit en float32)"""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(loc=20.0, scale=5.0, size=(n_samples, n_features))
+    y = 1000.0 * X[:, 0] + 50.0 * X[:, 1] ** 2 - 300.0 * X[:, 2] + rng.normal(scale=10.0, size=n_samples)
+    return X, y
+
+
+def _model(kind):
+    if kind == 'random_forest':
+        return RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0)
+    if kind == 'gradient_boosting':
+        return GradientBoostingRegressor(n_estimators=50, max_depth=4, random_state=0)
+    xgb = pytest.importorskip('xgboost')
+    return xgb.XGBRegressor(n_estimators=80, max_depth=5, learning_rate=0.1, random_state=0)
+
+
+@pytest.mark.parametrize('kind', ['random_forest', 'gradient_boosting', 'xgboost'])
+def test_compiled_model_matches_original(kind):
+    X, y = _training_data()
+    scaler = StandardScaler().fit(X)
+    model = _model(kind).fit(scaler.transform(X), y)
+
+    compiled = compile_ensemble(model, scaler)
+    rows = np.vstack([X, sample_inputs(scaler, X.shape[1], n_samples=2000)])
+    report = verify(model, scaler, compiled, rows)
+
+    assert report['ok'], report
+
+
+def test_verify_reports_mismatches():
+    X, y = _training_data()
+    scaler = StandardScaler().fit(X)
+    model = RandomForestRegressor(n_estimators=5, max_depth=4, random_state=0).fit(scaler.transform(X), y)
+    compiled = compile_ensemble(model, scaler)
+    compiled.base += 100.0
+
+    report = verify(model, scaler, compiled, X)
+
+    assert not report['ok']
+    assert report['mismatches'] == len(X)
@@ -1,13 +1,32 @@
-import json
+import os
 import random
 import re
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+import threading
+import time as clock
+import zlib
+from contextlib import nullcontext
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Any, Optional, Set, Tuple
+
+from exercise_catalog import ExerciseCatalog, constraints_to_mask
+from keyword_matcher import KeywordMatcher
+from program_cache import ProgramCache
 
 class AIExercisePlanner:
-    def __init__(self, exercises_file='data/exercises.json'):
-        with open(exercises_file, 'r', encoding='utf-8') as f:
-            self.exercises_db = json.load(f)
+    def __init__(self, exercises_file='data/exercises.json', cache_size=256, reload_interval=2.0):
+        # Bibliothèque et pools de candidats pré-filtrés (rechargés si le fichier change)
+        self.exercises_file = exercises_file
+        self.reload_interval = reload_interval
+        self._catalog = ExerciseCatalog.from_file(exercises_file)
+        self._catalog_mtime = self._catalog.source_mtime
+        self._catalog_checked_at = clock.monotonic()
+        self._reload_lock = threading.Lock()
+        
+        # Programmes déjà générés, par analyse normalisée
+        self.program_cache = ProgramCache(cache_size)
+        
+        # Registre de métriques (instrumentation.MetricsRegistry), fourni par le service Flask
+        self.metrics = None
         
         # Mapping des catégories d'objectifs vers les catégories d'exercices
         self.goal_category_mapping = {
@@ -19,24 +38,123 @@ class AIExercisePlanner:
             'General': ['Cardio', 'Strength', 'Flexibility', 'Core']
         }
 
+        # Vocabulaires de détection, par ordre de priorité
+        self.goal_keywords = {
+            'Weight Loss': ['perdre', 'poids', 'maigrir', 'weight', 'fat', 'gross'],
+            'Muscle Gain': ['muscle', 'prendre', 'masse', 'gain', 'strength'],
+            'Endurance': ['endurance', 'cardio', 'course', 'run'],
+            'Flexibility': ['flexible', 'étirement', 'yoga', 'stretch'],
+            'Rehabilitation': ['rééducation', 'rehab', 'blessure', 'injury']
+        }
+        self.difficulty_keywords = {
+            'Beginner': ['débutant', 'beginner', 'jamais', 'first', 'debutant'],
+            'Advanced': ['avancé', 'advanced', 'expert', 'confirmé']
+        }
+        self.constraint_keywords = {
+            'knee_pain': ['genou', 'knee', 'articulation'],
+            'back_pain': ['dos', 'back', 'lombaires'],
+            'shoulder_pain': ['épaule', 'shoulder']
+        }
+
+        # Automate construit une seule fois pour tous les vocabulaires
+        self._keyword_matcher = KeywordMatcher(
+            (word, (field, value))
+            for field, vocabulary in (
+                ('goal', self.goal_keywords),
+                ('difficulty', self.difficulty_keywords),
+                ('constraint', self.constraint_keywords)
+            )
+            for value, words in vocabulary.items()
+            for word in words
+        )
+
+        # Une seule regex pour la durée et la fréquence
+        self._numbers_pattern = re.compile(
+            r'(?P<sessions>\d+)\s*(?:séance|session|fois)\s*par\s*(?:semaine|week)'
+            r'|(?P<months>\d+)\s*(?:mois|month)'
+            r'|(?P<weeks>\d+)\s*(?:semaine|week)'
+        )
+
+    @property
+    def catalog(self) -> ExerciseCatalog:
+        """Catalogue courant, rechargé si le fichier d'exercices a changé"""
+        if clock.monotonic() - self._catalog_checked_at >= self.reload_interval:
+            self.reload_catalog()
+        return self._catalog
+
+    @property
+    def exercises_db(self) -> Dict[str, Any]:
+        """Bibliothèque d'exercices brute (catégorie -> niveau -> exercices)"""
+        return self.catalog.exercises_db
+
+    def reload_catalog(self, force: bool = False) -> bool:
+        """
+        Recharge le catalogue si la date de modification du fichier a changé.
+
+        Le nouveau catalogue et tous ses index sont construits à part puis
+        substitués en une seule affectation; en cas d'erreur l'ancien reste actif.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            # Un autre thread recharge déjà: on sert l'ancien catalogue en attendant
+            return False
+        
+        try:
+            self._catalog_checked_at = clock.monotonic()
+            try:
+                mtime = os.stat(self.exercises_file).st_mtime
+            except OSError:
+                return False
+            
+            if not force and mtime == self._catalog_mtime:
+                return False
+            
+            # Un fichier invalide n'est signalé qu'une fois par modification
+            self._catalog_mtime = mtime
+            try:
+                catalog = ExerciseCatalog.from_file(self.exercises_file)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Rechargement des exercices ignoré: {e}")
+                return False
+            
+            if catalog.version != self._catalog.version:
+                self.program_cache.clear()
+            self._catalog = catalog
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def _stage(self, name: str):
+        """Chronomètre une étape si un registre de métriques est branché"""
+        return self.metrics.stage(name) if self.metrics is not None else nullcontext()
+
     def analyze_user_request(self, user_input: str) -> Dict[str, Any]:
         """Analyse la demande en langage naturel"""
+        with self._stage('request_analysis'):
+            return self._analyze_user_request(user_input)
+
+    def _analyze_user_request(self, user_input: str) -> Dict[str, Any]:
         user_input = user_input.lower()
         
+        # Un seul passage de l'automate pour tous les mots-clés
+        labels = self._keyword_matcher.find_labels(user_input)
+        
+        # Un seul passage de la regex pour tous les nombres
+        numbers = self._extract_numbers(user_input)
+        
         # Détection de l'objectif
-        goal_type = self._detect_goal_type(user_input)
+        goal_type = self._detect_goal_type(labels)
         
         # Détection du niveau
-        difficulty_level = self._detect_difficulty(user_input)
+        difficulty_level = self._detect_difficulty(labels)
         
         # Détection de la durée en semaines
-        duration_weeks = self._detect_duration_weeks(user_input)
+        duration_weeks = self._detect_duration_weeks(numbers)
         
         # Détection des séances par semaine
-        sessions_per_week = self._detect_sessions_per_week(user_input)
+        sessions_per_week = self._detect_sessions_per_week(numbers)
         
         # Détection des contraintes
-        constraints = self._detect_constraints(user_input)
+        constraints = self._detect_constraints(labels)
         
         # Générer un titre
         title = self._generate_goal_title(goal_type, difficulty_level, duration_weeks)
@@ -55,65 +173,52 @@ class AIExercisePlanner:
             'raw_input': user_input
         }
 
-    def _detect_goal_type(self, text: str) -> str:
+    def _extract_numbers(self, text: str) -> Dict[str, int]:
+        """Extrait la première occurrence de chaque motif numérique (mois, semaines, séances)"""
+        numbers = {}
+        for match in self._numbers_pattern.finditer(text):
+            kind = match.lastgroup
+            if kind not in numbers:
+                numbers[kind] = int(match.group(kind))
+        return numbers
+
+    def _detect_goal_type(self, labels: Set[Tuple[str, str]]) -> str:
         """Détecte le type d'objectif"""
-        if any(word in text for word in ['perdre', 'poids', 'maigrir', 'weight', 'fat', 'gross']):
-            return 'Weight Loss'
-        elif any(word in text for word in ['muscle', 'prendre', 'masse', 'gain', 'strength']):
-            return 'Muscle Gain'
-        elif any(word in text for word in ['endurance', 'cardio', 'course', 'run']):
-            return 'Endurance'
-        elif any(word in text for word in ['flexible', 'étirement', 'yoga', 'stretch']):
-            return 'Flexibility'
-        elif any(word in text for word in ['rééducation', 'rehab', 'blessure', 'injury']):
-            return 'Rehabilitation'
-        else:
-            return 'General'
+        for goal_type in self.goal_keywords:
+            if ('goal', goal_type) in labels:
+                return goal_type
+        return 'General'
 
-    def _detect_difficulty(self, text: str) -> str:
+    def _detect_difficulty(self, labels: Set[Tuple[str, str]]) -> str:
         """Détecte le niveau de difficulté"""
-        if any(word in text for word in ['débutant', 'beginner', 'jamais', 'first', 'debutant']):
-            return 'Beginner'
-        elif any(word in text for word in ['avancé', 'advanced', 'expert', 'confirmé']):
-            return 'Advanced'
-        else:
-            return 'Intermediate'
+        for difficulty in self.difficulty_keywords:
+            if ('difficulty', difficulty) in labels:
+                return difficulty
+        return 'Intermediate'
 
-    def _detect_duration_weeks(self, text: str) -> int:
+    def _detect_duration_weeks(self, numbers: Dict[str, int]) -> int:
         """Détecte la durée en semaines"""
-        # Cherche des patterns comme "3 mois", "12 semaines", etc.
-        months_match = re.search(r'(\d+)\s*(mois|month)', text)
-        if months_match:
-            return int(months_match.group(1)) * 4
+        # Patterns comme "3 mois", "12 semaines", etc.
+        if 'months' in numbers:
+            return numbers['months'] * 4
         
-        weeks_match = re.search(r'(\d+)\s*(semaine|week)', text)
-        if weeks_match:
-            return int(weeks_match.group(1))
+        if 'weeks' in numbers:
+            return numbers['weeks']
         
         # Par défaut
         return 8
 
-    def _detect_sessions_per_week(self, text: str) -> int:
+    def _detect_sessions_per_week(self, numbers: Dict[str, int]) -> int:
         """Détecte le nombre de séances par semaine"""
-        sessions_match = re.search(r'(\d+)\s*(séance|session|fois)\s*par\s*(semaine|week)', text)
-        if sessions_match:
-            return int(sessions_match.group(1))
-        
         # Par défaut
-        return 3
+        return numbers.get('sessions', 3)
 
-    def _detect_constraints(self, text: str) -> List[str]:
+    def _detect_constraints(self, labels: Set[Tuple[str, str]]) -> List[str]:
         """Détecte les contraintes"""
-        constraints = []
-        
-        if any(word in text for word in ['genou', 'knee', 'articulation']):
-            constraints.append('knee_pain')
-        if any(word in text for word in ['dos', 'back', 'lombaires']):
-            constraints.append('back_pain')
-        if any(word in text for word in ['épaule', 'shoulder']):
-            constraints.append('shoulder_pain')
-        
-        return constraints
+        return [
+            constraint for constraint in self.constraint_keywords
+            if ('constraint', constraint) in labels
+        ]
 
     def _generate_goal_title(self, goal_type: str, difficulty: str, weeks: int) -> str:
         """Génère un titre pour l'objectif"""
@@ -139,35 +244,309 @@ class AIExercisePlanner:
         }
         return descriptions.get(goal_type, f"Programme personnalisé de {weeks} semaines, {sessions} séances/semaine, niveau {difficulty}")
 
-    def generate_complete_program(self, user_request: str) -> Dict[str, Any]:
-        """Génère un programme complet basé sur la demande"""
+    def generate_complete_program(self, user_request: str, seed: Optional[int] = None,
+                                  start_date: Optional[datetime] = None,
+                                  week_from: int = 1, week_to: Optional[int] = None,
+                                  compact: bool = False, template_rotation: int = 0) -> Dict[str, Any]:
+        """
+        Génère un programme basé sur la demande.
+
+        Seules les semaines week_from..week_to sont générées (tout le programme par
+        défaut); les autres pages se reproduisent à l'identique avec la même graine
+        et la même date de début. En mode compact, les plans ne référencent les
+        exercices que par leur ID (voir _compact_daily_plans). Avec
+        template_rotation > 0, les séances sont tirées de modèles par phase
+        (voir iter_daily_plans).
+
+        Sans graine ni date, la génération est déterministe (graine dérivée de
+        l'analyse, début aujourd'hui à minuit): deux formulations équivalentes
+        d'une même demande sont servies depuis le cache.
+        """
         # Analyser la demande
         analysis = self.analyze_user_request(user_request)
+        program_key = self._program_key(analysis)
         
-        # Générer les plans quotidiens
-        daily_plans = self._generate_daily_plans(analysis)
+        # Même catalogue pour toute la requête, même si un rechargement survient
+        catalog = self.catalog
         
-        return {
-            'goal': {
-                'title': analysis['title'],
-                'description': analysis['description'],
-                'category': analysis['category'],
-                'status': 'PENDING',
-                'startDate': datetime.now().isoformat(),
-                'endDate': (datetime.now() + timedelta(weeks=analysis['durationWeeks'])).isoformat(),
-                'difficultyLevel': analysis['difficultyLevel'],
-                'sessionsPerWeek': analysis['sessionsPerWeek'],
-                'durationWeeks': analysis['durationWeeks'],
-                'progress': 0,
-                'targetAudience': analysis['category']
-            },
+        # Graine de génération (dérivée de l'analyse si absente, renvoyée pour reproduire le programme)
+        if seed is None:
+            seed = zlib.crc32(repr(program_key).encode('utf-8'))
+        
+        # Date de début
+        if start_date is None:
+            start_date = datetime.combine(date.today(), time())
+        
+        # Bornes de la page demandée
+        total_weeks = analysis['durationWeeks']
+        week_from = max(1, week_from)
+        week_to = total_weeks if week_to is None else min(week_to, total_weeks)
+        
+        # Générer les plans quotidiens de la page (ou les reprendre du cache)
+        cache_key = (catalog.version, program_key, seed, start_date.isoformat(), week_from, week_to,
+                     compact, template_rotation)
+        cached = self.program_cache.get(cache_key)
+        if cached is None:
+            with self._stage('plan_generation'):
+                daily_plans = list(self.iter_daily_plans(
+                    analysis, seed, start_date, week_from, week_to, catalog, template_rotation
+                ))
+                exercises = None
+                if compact:
+                    exercises, daily_plans = self._compact_daily_plans(daily_plans, catalog)
+            cached = (daily_plans, exercises)
+            self.program_cache.put(cache_key, cached)
+        daily_plans, exercises = cached
+        
+        program = {
+            'goal': self._goal_payload(analysis, start_date),
             'daily_plans': daily_plans,
-            'analysis': analysis
+            'analysis': analysis,
+            'seed': seed,
+            'pagination': {
+                'week_from': week_from,
+                'week_to': week_to,
+                'total_weeks': total_weeks,
+                'next_week_from': week_to + 1 if week_to < total_weeks else None
+            }
+        }
+        
+        if compact:
+            program['exercises'] = exercises
+        
+        return program
+
+    def _goal_payload(self, analysis: Dict[str, Any], start_date: datetime) -> Dict[str, Any]:
+        """Objectif (Goal) correspondant à une analyse"""
+        return {
+            'title': analysis['title'],
+            'description': analysis['description'],
+            'category': analysis['category'],
+            'status': 'PENDING',
+            'startDate': start_date.isoformat(),
+            'endDate': (start_date + timedelta(weeks=analysis['durationWeeks'])).isoformat(),
+            'difficultyLevel': analysis['difficultyLevel'],
+            'sessionsPerWeek': analysis['sessionsPerWeek'],
+            'durationWeeks': analysis['durationWeeks'],
+            'progress': 0,
+            'targetAudience': analysis['category']
+        }
+
+    def replan_program(self, analysis: Dict[str, Any], seed: int, start_date: datetime,
+                       changes: Dict[str, Any], as_of: datetime,
+                       daily_plans: Optional[List[Dict[str, Any]]] = None,
+                       exercises: Optional[Dict[str, Dict[str, Any]]] = None,
+                       compact: bool = False, template_rotation: int = 0) -> Dict[str, Any]:
+        """
+        Replanifie un programme existant à partir de la date as_of.
+
+        Les séances passées (date < as_of) et celles qui ne sont plus 'planned'
+        sont conservées telles quelles. Si la structure change (séances par
+        semaine, durée, niveau, catégorie), les semaines futures sont régénérées
+        depuis la graine; si seules les contraintes changent, seules les séances
+        contenant un exercice devenu contre-indiqué sont retirées.
+
+        Sans daily_plans, les plans existants sont reconstitués depuis la graine à
+        partir de la semaine de as_of, et seules les séances futures sont renvoyées.
+        """
+        catalog = self.catalog
+        new_analysis = self._apply_changes(analysis, changes)
+        as_of_day = as_of.strftime('%Y-%m-%d')
+        as_of_week = max(1, (as_of.date() - start_date.date()).days // 7 + 1)
+        
+        if daily_plans is None:
+            kept = []
+            future = [
+                plan for plan in self.iter_daily_plans(
+                    analysis, seed, start_date, as_of_week, catalog=catalog, template_rotation=template_rotation
+                )
+                if plan['date'] >= as_of_day
+            ]
+        else:
+            existing = self._expand_daily_plans(daily_plans, exercises or {}, catalog)
+            kept = [plan for plan in existing if plan['date'] < as_of_day or plan.get('status') != 'planned']
+            future = [plan for plan in existing if plan['date'] >= as_of_day and plan.get('status') == 'planned']
+        
+        structural_keys = ('category', 'difficultyLevel', 'durationWeeks', 'sessionsPerWeek')
+        if any(new_analysis[key] != analysis[key] for key in structural_keys):
+            # Nouvelle structure: toutes les séances futures sont régénérées
+            locked = {(plan['week_number'], plan['session_number']) for plan in kept}
+            replanned = [
+                plan for plan in self.iter_daily_plans(
+                    new_analysis, seed, start_date, as_of_week, catalog=catalog, template_rotation=template_rotation
+                )
+                if plan['date'] >= as_of_day and (plan['week_number'], plan['session_number']) not in locked
+            ]
+            regenerated = len(replanned)
+        else:
+            # Mêmes séances: seules celles qui contiennent un exercice désormais contre-indiqué changent
+            added_mask = constraints_to_mask(new_analysis['constraints']) & ~constraints_to_mask(analysis['constraints'])
+            replanned, regenerated = self._replace_contraindicated_sessions(
+                future, new_analysis, added_mask, seed, catalog
+            )
+        
+        new_plans = sorted(kept + replanned, key=lambda plan: (plan['date'], plan['session_number']))
+        program = {
+            'goal': self._goal_payload(new_analysis, start_date),
+            'daily_plans': new_plans,
+            'analysis': new_analysis,
+            'seed': seed,
+            'replan': {
+                'as_of': as_of_day,
+                'kept': len(new_plans) - regenerated,
+                'regenerated': regenerated
+            }
         }
+        
+        if compact:
+            program['exercises'], program['daily_plans'] = self._compact_daily_plans(new_plans, catalog)
+        
+        return program
+
+    def _apply_changes(self, analysis: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+        """Applique un jeu de modifications à une analyse (copie) et régénère titre et description"""
+        new_analysis = dict(analysis)
+        new_analysis['constraints'] = list(analysis.get('constraints', []))
+        
+        for key in ('category', 'difficultyLevel', 'durationWeeks', 'sessionsPerWeek'):
+            if changes.get(key) is not None:
+                new_analysis[key] = int(changes[key]) if key in ('durationWeeks', 'sessionsPerWeek') else changes[key]
+        
+        if changes.get('constraints') is not None:
+            new_analysis['constraints'] = list(changes['constraints'])
+        for constraint in changes.get('add_constraints', []):
+            if constraint not in new_analysis['constraints']:
+                new_analysis['constraints'].append(constraint)
+        for constraint in changes.get('remove_constraints', []):
+            if constraint in new_analysis['constraints']:
+                new_analysis['constraints'].remove(constraint)
+        
+        new_analysis['title'] = self._generate_goal_title(
+            new_analysis['category'], new_analysis['difficultyLevel'], new_analysis['durationWeeks']
+        )
+        new_analysis['description'] = self._generate_goal_description(
+            new_analysis['category'], new_analysis['difficultyLevel'],
+            new_analysis['durationWeeks'], new_analysis['sessionsPerWeek']
+        )
+        return new_analysis
+
+    def _expand_daily_plans(self, daily_plans: List[Dict[str, Any]], exercises: Dict[str, Dict[str, Any]],
+                            catalog: ExerciseCatalog) -> List[Dict[str, Any]]:
+        """Remet les plans compacts (exercise_ids) sous leur forme complète (exercices)"""
+        expanded = []
+        for plan in daily_plans:
+            if 'exercise_ids' not in plan:
+                expanded.append(plan)
+                continue
+            
+            overrides = plan.get('overrides', {})
+            plan_exercises = []
+            for exercise_id in plan['exercise_ids']:
+                exercise = exercises.get(exercise_id) or catalog.by_id.get(exercise_id) or {'id': exercise_id}
+                if exercise_id in overrides:
+                    exercise = {**exercise, **overrides[exercise_id]}
+                plan_exercises.append(exercise)
+            
+            full_plan = {key: value for key, value in plan.items() if key not in ('exercise_ids', 'overrides')}
+            full_plan['exercices'] = plan_exercises
+            expanded.append(full_plan)
+        return expanded
+
+    def _replace_contraindicated_sessions(self, future: List[Dict[str, Any]], analysis: Dict[str, Any],
+                                          added_mask: int, seed: int,
+                                          catalog: ExerciseCatalog) -> Tuple[List[Dict[str, Any]], int]:
+        """Retire les séances futures touchées par de nouvelles contraintes; les autres restent intactes"""
+        if not added_mask:
+            return future, 0
+        
+        exercise_categories = self.goal_category_mapping.get(analysis['category'], ['Cardio', 'Strength'])
+        constraint_mask = constraints_to_mask(analysis['constraints'])
+        replanned = []
+        regenerated = 0
+        
+        for plan in future:
+            if not any(catalog.exercise_mask(exercise) & added_mask for exercise in plan['exercices']):
+                replanned.append(plan)
+                continue
+            
+            week, session_num = plan['week_number'], plan['session_number']
+            rng = random.Random(f"{seed}:replan:{week}:{session_num}:{constraint_mask}")
+            intensity = self._calculate_week_intensity(week, analysis['durationWeeks'])
+            selected_exercises, total_duration, total_calories = self._build_session(
+                exercise_categories, analysis['difficultyLevel'], intensity, constraint_mask, rng, catalog
+            )
+            replanned.append({
+                **plan,
+                'calories': total_calories,
+                'duree_min': total_duration,
+                'exercices': selected_exercises
+            })
+            regenerated += 1
+        
+        return replanned, regenerated
 
-    def _generate_daily_plans(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Génère tous les plans quotidiens"""
-        daily_plans = []
+    def _program_key(self, analysis: Dict[str, Any]) -> Tuple:
+        """Clé normalisée d'une analyse: tout ce qui influence les plans générés"""
+        return (
+            analysis['category'],
+            analysis['difficultyLevel'],
+            analysis['durationWeeks'],
+            analysis['sessionsPerWeek'],
+            tuple(sorted(analysis.get('constraints', [])))
+        )
+
+    def _compact_daily_plans(self, daily_plans: List[Dict[str, Any]],
+                             catalog: ExerciseCatalog) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Remplace les exercices embarqués par leurs IDs.
+
+        Retourne le dictionnaire dédupliqué des exercices utilisés et les plans où
+        'exercices' devient 'exercise_ids'; les champs qui diffèrent de la
+        bibliothèque pour une séance sont conservés dans 'overrides'.
+        """
+        exercises = {}
+        compact_plans = []
+        
+        for plan in daily_plans:
+            exercise_ids = []
+            overrides = {}
+            
+            for exercise in plan['exercices']:
+                exercise_id = exercise['id']
+                reference = catalog.by_id.get(exercise_id, exercise)
+                exercises.setdefault(exercise_id, reference)
+                exercise_ids.append(exercise_id)
+                
+                if exercise is not reference:
+                    changed = {key: value for key, value in exercise.items() if reference.get(key) != value}
+                    if changed:
+                        overrides[exercise_id] = changed
+            
+            compact_plan = {key: value for key, value in plan.items() if key != 'exercices'}
+            compact_plan['exercise_ids'] = exercise_ids
+            if overrides:
+                compact_plan['overrides'] = overrides
+            compact_plans.append(compact_plan)
+        
+        return exercises, compact_plans
+
+    def iter_daily_plans(self, analysis: Dict[str, Any], seed: int, start_date: datetime,
+                         week_from: int = 1, week_to: Optional[int] = None,
+                         catalog: Optional[ExerciseCatalog] = None,
+                         template_rotation: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Génère paresseusement les plans quotidiens, semaine par semaine.
+
+        Chaque semaine a son propre générateur aléatoire dérivé de (graine, semaine):
+        n'importe quelle semaine se régénère sans calculer les précédentes.
+
+        Mode modèle (template_rotation > 0): une séance type est tirée par
+        (intensité, numéro de séance, variante), avec template_rotation variantes
+        alternées d'une semaine à l'autre, puis recopiée sur chaque semaine avec
+        sa date. Le nombre de tirages dépend alors des phases, pas de la durée.
+        """
+        if catalog is None:
+            catalog = self.catalog
         
         # Types d'exercices pour cette catégorie
         exercise_categories = self.goal_category_mapping.get(
@@ -178,36 +557,47 @@ class AIExercisePlanner:
         # Niveau
         level = analysis['difficultyLevel']
         
-        # Date de début
-        current_date = datetime.now()
+        # Contraintes, calculées une fois pour tout le programme
+        constraint_mask = constraints_to_mask(analysis.get('constraints', []))
+        
+        total_weeks = analysis['durationWeeks']
+        if week_to is None:
+            week_to = total_weeks
+        
+        # Séances types déjà tirées: (intensité, séance, variante) -> (exercices, durée, calories)
+        templates = {}
         
         # Générer semaine par semaine
-        for week in range(1, analysis['durationWeeks'] + 1):
+        for week in range(max(1, week_from), min(week_to, total_weeks) + 1):
+            rng = random.Random(f"{seed}:{week}")
+            
             # Adapter l'intensité selon la semaine
-            week_intensity = self._calculate_week_intensity(week, analysis['durationWeeks'])
+            week_intensity = self._calculate_week_intensity(week, total_weeks)
             
             # Générer les séances de la semaine
             for session_num in range(1, analysis['sessionsPerWeek'] + 1):
                 # Date de la séance (espacée dans la semaine)
-                session_date = current_date + timedelta(
+                session_date = start_date + timedelta(
                     weeks=week-1, 
                     days=(session_num * 2) % 7  # Espace les séances
                 )
                 
-                # Sélectionner les exercices
-                selected_exercises = self._select_exercises(
-                    exercise_categories, 
-                    level, 
-                    week_intensity,
-                    analysis.get('constraints', [])
-                )
-                
-                # Calculer la durée totale et calories
-                total_duration = sum(ex.get('duration', 0) for ex in selected_exercises)
-                total_calories = sum(ex.get('calories', 0) * ex.get('duration', 0) for ex in selected_exercises)
+                if template_rotation > 0:
+                    template_key = (week_intensity, session_num, (week - 1) % template_rotation)
+                    session = templates.get(template_key)
+                    if session is None:
+                        template_rng = random.Random(f"{seed}:template:{':'.join(map(str, template_key))}")
+                        session = templates[template_key] = self._build_session(
+                            exercise_categories, level, week_intensity, constraint_mask, template_rng, catalog
+                        )
+                else:
+                    session = self._build_session(
+                        exercise_categories, level, week_intensity, constraint_mask, rng, catalog
+                    )
+                selected_exercises, total_duration, total_calories = session
                 
                 # Créer le plan
-                daily_plan = {
+                yield {
                     'date': session_date.strftime('%Y-%m-%d'),
                     'status': 'planned',
                     'notes': '',
@@ -218,10 +608,26 @@ class AIExercisePlanner:
                     'week_number': week,
                     'session_number': session_num
                 }
-                
-                daily_plans.append(daily_plan)
+
+    def _build_session(self, categories: List[str], level: str, intensity: str, constraint_mask: int,
+                       rng: random.Random, catalog: ExerciseCatalog) -> Tuple[List[Dict[str, Any]], int, int]:
+        """Tire les exercices d'une séance et calcule sa durée totale et ses calories"""
+        # Sélectionner les exercices
+        with self._stage('exercise_selection'):
+            selected_exercises = self._select_exercises(
+                categories, 
+                level, 
+                intensity,
+                constraint_mask,
+                rng,
+                catalog
+            )
+        
+        # Calculer la durée totale et calories
+        total_duration = sum(ex.get('duration', 0) for ex in selected_exercises)
+        total_calories = sum(ex.get('calories', 0) * ex.get('duration', 0) for ex in selected_exercises)
         
-        return daily_plans
+        return selected_exercises, total_duration, total_calories
 
     def _calculate_week_intensity(self, week: int, total_weeks: int) -> str:
         """Calcule l'intensité pour une semaine donnée"""
@@ -232,7 +638,8 @@ class AIExercisePlanner:
         else:
             return 'normal'
 
-    def _select_exercises(self, categories: List[str], level: str, intensity: str, constraints: List[str]) -> List[Dict[str, Any]]:
+    def _select_exercises(self, categories: List[str], level: str, intensity: str, constraint_mask: int,
+                          rng: random.Random, catalog: ExerciseCatalog) -> List[Dict[str, Any]]:
         """Sélectionne des exercices appropriés"""
         selected = []
         
@@ -248,30 +655,12 @@ class AIExercisePlanner:
         per_category = max(1, num_exercises // len(categories))
         
         for category in categories:
-            if category in self.exercises_db:
-                category_exercises = self.exercises_db[category]
-                
-                if level in category_exercises:
-                    available = category_exercises[level].copy()
-                    
-                    # Filtrer selon les contraintes
-                    available = self._filter_by_constraints(available, constraints)
-                    
-                    # Sélectionner aléatoirement
-                    if available:
-                        num_to_take = min(len(available), per_category)
-                        selected.extend(random.sample(available, num_to_take))
+            # Candidats déjà filtrés selon les contraintes
+            available = catalog.candidates(category, level, constraint_mask)
+            
+            # Sélectionner aléatoirement
+            if available:
+                num_to_take = min(len(available), per_category)
+                selected.extend(rng.sample(available, num_to_take))
         
         return selected
-
-    def _filter_by_constraints(self, exercises: List[Dict], constraints: List[str]) -> List[Dict]:
-        """Filtre les exercices selon les contraintes"""
-        if 'knee_pain' in constraints:
-            filtered = []
-            for ex in exercises:
-                name = ex.get('name', '').lower()
-                if not any(word in name for word in ['squat', 'fente', 'lunge']):
-                    filtered.append(ex)
-            return filtered
-        
-        return exercises
\ No newline at end of file
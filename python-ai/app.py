@@ -1,24 +1,90 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from ai_engine import AIExercisePlanner
+from exercise_catalog import constraints_to_mask
+from planner_pool import PlannerPool, PlannerPoolFull
 import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+# Module d'instrumentation partagé avec ai_model_doctor
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python-common'))
+from instrumentation import MetricsRegistry, instrument_flask
 
 app = Flask(__name__)
 CORS(app)  # Permet les requêtes depuis Symfony
 
+# Métriques Prometheus exposées sur /metrics
+metrics = MetricsRegistry('wellora_ai')
+instrument_flask(app, metrics)
+
 # Initialiser le moteur IA
-planner = AIExercisePlanner()
+planner = AIExercisePlanner(cache_size=int(os.environ.get('AI_PROGRAM_CACHE_SIZE', 256)))
+planner.metrics = metrics
+
+metrics.callback(
+    'program_cache_requests_total', 'Consultations du cache de programmes', 'counter', ('result',),
+    lambda: {('hit',): planner.program_cache.hits, ('miss',): planner.program_cache.misses}
+)
+
+# Nombre maximal de demandes par appel à /api/generate-programs
+MAX_BATCH_REQUESTS = int(os.environ.get('AI_MAX_BATCH_REQUESTS', 5000))
+
+# Taille de page maximale de /api/exercises/search
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Pool de processus pour les lots et les programmes longs (désactivé si 0 worker)
+PLANNER_WORKERS = int(os.environ.get('AI_PLANNER_WORKERS', 0))
+PLANNER_QUEUE_LIMIT = int(os.environ.get('AI_PLANNER_QUEUE_LIMIT', PLANNER_WORKERS * 4))
+POOL_MIN_SESSIONS = int(os.environ.get('AI_POOL_MIN_SESSIONS', 100))
+
+_planner_pool = None
+_planner_pool_lock = threading.Lock()
+
+def _get_planner_pool():
+    """Crée le pool au premier usage (pas dans le processus de rechargement de Flask)"""
+    global _planner_pool
+    if PLANNER_WORKERS <= 0:
+        return None
+    with _planner_pool_lock:
+        if _planner_pool is None:
+            _planner_pool = PlannerPool(
+                planner.exercises_file,
+                workers=PLANNER_WORKERS,
+                queue_limit=max(PLANNER_QUEUE_LIMIT, PLANNER_WORKERS)
+            )
+        return _planner_pool
+
+def _is_long_program(user_request, options):
+    """Vrai si la page demandée compte assez de séances pour justifier le pool"""
+    analysis = planner.analyze_user_request(user_request)
+    week_from = max(1, options.get('week_from', 1))
+    week_to = min(options.get('week_to', analysis['durationWeeks']), analysis['durationWeeks'])
+    return (week_to - week_from + 1) * analysis['sessionsPerWeek'] >= POOL_MIN_SESSIONS
 
 @app.route('/health', methods=['GET'])
 def health():
     """Endpoint de vérification"""
-    return jsonify({'status': 'ok', 'message': 'AI Service is running'})
+    return jsonify({
+        'status': 'ok',
+        'message': 'AI Service is running',
+        'program_cache': planner.program_cache.stats()
+    })
 
 @app.route('/api/generate-program', methods=['POST'])
 def generate_program():
     """
     Génère un programme complet basé sur la demande utilisateur
-    Body: {"user_request": "Je veux perdre du poids en 3 mois"}
+    Body: {"user_request": "Je veux perdre du poids en 3 mois", "seed": 42,
+           "start_date": "2026-03-02T08:00:00", "week_from": 1, "week_to": 4}
+    Les semaines suivantes s'obtiennent avec la même graine et la même date de début
+    (renvoyées dans le programme) et "week_from" = pagination.next_week_from.
+    Avec "compact": true, les plans ne contiennent que des IDs d'exercices et le
+    programme un dictionnaire "exercises" dédupliqué.
+    Avec "template": true, les séances sont recopiées depuis des séances types par
+    phase d'intensité ("template_rotation" variantes alternées, 2 par défaut).
     """
     try:
         data = request.json
@@ -27,14 +93,199 @@ def generate_program():
         if not user_request:
             return jsonify({'error': 'user_request is required'}), 400
         
-        # Générer le programme
-        program = planner.generate_complete_program(user_request)
+        # Générer le programme (graine, date de début et plage de semaines optionnelles)
+        options = _program_options(data)
+        pool = _get_planner_pool()
+        if pool is not None and _is_long_program(user_request, options):
+            program = pool.submit(user_request, options).result()
+        else:
+            program = planner.generate_complete_program(user_request, **options)
         
-        return jsonify({
-            'success': True,
-            'program': program
+        with metrics.stage('json_encoding'):
+            return jsonify({
+                'success': True,
+                'program': program
+            })
+        
+    except PlannerPoolFull as e:
+        response = jsonify({
+            'success': False,
+            'error': str(e)
         })
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    except InvalidOption as e:
+        return _invalid_option_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/generate-programs', methods=['POST'])
+def generate_programs():
+    """
+    Génère plusieurs programmes et les renvoie en NDJSON, une ligne par programme,
+    dans l'ordre des demandes et au fur et à mesure de leur génération.
+    Body: {"requests": [{"id": 12, "user_request": "Je veux perdre du poids en 3 mois", "seed": 42}, ...]}
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('requests')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'requests must be a non-empty list'}), 400
+    
+    if len(items) > MAX_BATCH_REQUESTS:
+        return jsonify({'error': f'too many requests (max {MAX_BATCH_REQUESTS})'}), 413
+    
+    def generate():
+        for result in _iter_batch_results(items):
+            with metrics.stage('json_encoding'):
+                line = json.dumps(result) + '\n'
+            yield line
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _iter_batch_results(items):
+    """Résultats du lot dans l'ordre des demandes, générés en ligne ou dans le pool"""
+    jobs = (_parse_batch_item(index, item) for index, item in enumerate(items))
+    pool = _get_planner_pool()
+    
+    if pool is None:
+        for result, job in jobs:
+            if job is not None:
+                try:
+                    result.update({'success': True, 'program': planner.generate_complete_program(job[0], **job[1])})
+                except Exception as e:
+                    result.update({'success': False, 'error': str(e)})
+            yield result
+        return
+    
+    for result, future in pool.generate_ordered(jobs):
+        if future is not None:
+            try:
+                result.update({'success': True, 'program': future.result()})
+            except Exception as e:
+                result.update({'success': False, 'error': str(e)})
+        yield result
+
+def _parse_batch_item(index, item):
+    """
+    Valide une demande du lot; retourne (résultat, job) où job = (user_request, options),
+    ou None si la demande est invalide (le résultat contient alors l'erreur)
+    """
+    if isinstance(item, str):
+        item = {'user_request': item}
+    elif not isinstance(item, dict):
+        item = {}
+    
+    result = {'index': index, 'id': item.get('id')}
+    try:
+        user_request = item.get('user_request', '')
+        if not user_request:
+            result.update({'success': False, 'error': 'user_request is required'})
+            return result, None
+        
+        return result, (user_request, _program_options(item))
+    except Exception as e:
+        result.update({'success': False, 'error': str(e)})
+        return result, None
+
+class InvalidOption(ValueError):
+    """Option du body invalide (erreur du client, réponse 400)"""
+
+    def __init__(self, field, expected):
+        super().__init__(f'invalid {field}: expected {expected}')
+        self.field = field
+
+def _int_option(value, field):
+    """Entier du body (les booléens et les nombres non entiers sont refusés)"""
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise InvalidOption(field, 'an integer')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidOption(field, 'an integer') from None
+
+def _date_option(value, field):
+    """Date ISO du body (2026-04-01 ou 2026-04-01T08:00:00)"""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidOption(field, 'an ISO date (YYYY-MM-DD)') from None
+
+def _invalid_option_response(e):
+    return jsonify({
+        'success': False,
+        'error': str(e),
+        'field': e.field
+    }), 400
+
+def _program_options(data):
+    """
+    Extrait les options de génération (graine, date, plage de semaines, modes compact et modèle) du body.
+    InvalidOption si une valeur n'a pas le bon type.
+    """
+    options = {}
+    if data.get('seed') is not None:
+        options['seed'] = _int_option(data['seed'], 'seed')
+    if data.get('start_date'):
+        options['start_date'] = _date_option(data['start_date'], 'start_date')
+    if data.get('week_from') is not None:
+        options['week_from'] = _int_option(data['week_from'], 'week_from')
+    if data.get('week_to') is not None:
+        options['week_to'] = _int_option(data['week_to'], 'week_to')
+    if data.get('compact'):
+        options['compact'] = True
+    if data.get('template'):
+        options['template_rotation'] = max(1, _int_option(data.get('template_rotation', 2), 'template_rotation'))
+    return options
+
+@app.route('/api/replan-program', methods=['POST'])
+def replan_program():
+    """
+    Replanifie un programme à partir d'une date, sans toucher aux séances passées
+    Body: {"program": {... programme renvoyé par /api/generate-program ...},
+           "changes": {"sessionsPerWeek": 4, "add_constraints": ["back_pain"]},
+           "as_of": "2026-04-01"}
+    À la place de "program", on peut fournir "analysis", "seed" et "start_date":
+    seules les séances futures sont alors renvoyées.
+    Modifications possibles: category, difficultyLevel, durationWeeks, sessionsPerWeek,
+    constraints, add_constraints, remove_constraints.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        program = data.get('program') or {}
+        analysis = program.get('analysis') or data.get('analysis')
+        seed = program.get('seed', data.get('seed'))
+        start_date = (program.get('goal') or {}).get('startDate') or data.get('start_date')
+        
+        if not analysis or seed is None or not start_date:
+            return jsonify({'error': 'program (or analysis, seed and start_date) is required'}), 400
+        
+        as_of = _date_option(data['as_of'], 'as_of') if data.get('as_of') else datetime.now()
+        options = _program_options(data)
+        
+        replanned = planner.replan_program(
+            analysis,
+            _int_option(seed, 'seed'),
+            _date_option(start_date, 'start_date'),
+            data.get('changes') or {},
+            as_of,
+            daily_plans=program.get('daily_plans'),
+            exercises=program.get('exercises'),
+            compact=options.get('compact', False),
+            template_rotation=options.get('template_rotation', 0)
+        )
+        
+        with metrics.stage('json_encoding'):
+            return jsonify({
+                'success': True,
+                'program': replanned
+            })
         
+    except InvalidOption as e:
+        return _invalid_option_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -66,8 +317,56 @@ def analyze_request():
 
 @app.route('/api/exercises', methods=['GET'])
 def get_exercises():
-    """Retourne la bibliothèque d'exercices"""
-    return jsonify(planner.exercises_db)
+    """Retourne la bibliothèque d'exercices (corps pré-encodé, ETag = version du catalogue)"""
+    catalog = planner.catalog
+    response = Response(catalog.exercises_json, mimetype='application/json')
+    response.set_etag(catalog.version)
+    return response.make_conditional(request)
+
+@app.route('/api/exercises/search', methods=['GET'])
+def search_exercises():
+    """
+    Recherche paginée dans la bibliothèque d'exercices
+    Query: q=squat&category=Strength&difficulty=Beginner&unit=reps
+           &min_calories=3&max_calories=8&min_duration=10&max_duration=30
+           &safe_for=knee_pain,back_pain&fields=id,name&page=1&per_page=20
+    """
+    try:
+        args = request.args
+        page = max(1, args.get('page', 1, type=int))
+        per_page = min(max(1, args.get('per_page', 20, type=int)), MAX_SEARCH_PAGE_SIZE)
+        safe_for = [value for value in args.get('safe_for', '').split(',') if value]
+        fields = [value for value in args.get('fields', '').split(',') if value]
+        
+        results = planner.catalog.search_index.search(
+            query=args.get('q', ''),
+            category=args.get('category'),
+            difficulty=args.get('difficulty'),
+            unit=args.get('unit'),
+            ranges={
+                'calories': (args.get('min_calories', type=float), args.get('max_calories', type=float)),
+                'duration': (args.get('min_duration', type=float), args.get('max_duration', type=float))
+            },
+            exclude_mask=constraints_to_mask(safe_for)
+        )
+        
+        page_results = results[(page - 1) * per_page:page * per_page]
+        if fields:
+            page_results = [{field: exercise.get(field) for field in fields} for exercise in page_results]
+        
+        return jsonify({
+            'success': True,
+            'total': len(results),
+            'page': page,
+            'per_page': per_page,
+            'results': page_results
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+from functools import lru_cache
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+import exercise_search
+from exercise_search import ExerciseSearchIndex, normalize_text
+
+# Un bit par contrainte physique détectée dans la demande
+CONSTRAINT_FLAGS = {
+    'knee_pain': 1,
+    'back_pain': 2,
+    'shoulder_pain': 4
+}
+
+# Mots du nom d'exercice qui le contre-indiquent pour chaque contrainte
+CONTRAINDICATION_KEYWORDS = {
+    'knee_pain': ['squat', 'fente', 'lunge'],
+    'back_pain': ['soulevé de terre', 'deadlift', 'rameur', 'russian twist', 'relevés de jambes'],
+    'shoulder_pain': ['pompes', 'développé', 'tractions', 'push-up', 'pull-up']
+}
+
+ALL_CONSTRAINTS_MASK = sum(CONSTRAINT_FLAGS.values())
+
+# Format du snapshot binaire: en-tête puis catalogue sérialisé avec pickle
+SNAPSHOT_MAGIC = b'WLCATSNP'
+SNAPSHOT_FORMAT = 1
+
+
+def constraints_to_mask(constraints: Iterable[str]) -> int:
+    """Convertit une liste de contraintes en masque de bits"""
+    mask = 0
+    for constraint in constraints:
+        mask |= CONSTRAINT_FLAGS.get(constraint, 0)
+    return mask
+
+
+def exercise_slug(*parts: str) -> str:
+    """Construit un identifiant lisible et stable (sans accents) à partir de ses parties"""
+    return re.sub(r'[^a-z0-9]+', '-', normalize_text('-'.join(parts))).strip('-')
+
+
+def contraindication_mask(exercise: Dict[str, Any]) -> int:
+    """Calcule le masque des contraintes pour lesquelles l'exercice est déconseillé"""
+    name = exercise.get('name', '').lower()
+    mask = 0
+    for constraint, words in CONTRAINDICATION_KEYWORDS.items():
+        if any(word in name for word in words):
+            mask |= CONSTRAINT_FLAGS[constraint]
+    return mask
+
+
+class ExerciseCatalog:
+    """
+    Bibliothèque d'exercices et index dérivés, calculés une fois au chargement.
+
+    Pour chaque (catégorie, niveau, masque de contraintes) on garde le tuple des
+    exercices compatibles : la sélection d'une séance n'est plus qu'un tirage.
+    Une instance n'est jamais modifiée après construction : un rechargement
+    construit un nouveau catalogue complet qui remplace l'ancien.
+    """
+
+    def __init__(self, exercises_db: Dict[str, Dict[str, List[Dict[str, Any]]]],
+                 version: Optional[str] = None, source_mtime: Optional[float] = None):
+        self.exercises_db = exercises_db
+        self.source_mtime = source_mtime
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.masks_by_id: Dict[str, int] = {}
+        self._pools: Dict[Tuple[str, str, int], Tuple[Dict[str, Any], ...]] = {}
+
+        search_entries = []
+        for category, levels in exercises_db.items():
+            for level, exercises in levels.items():
+                for exercise in exercises:
+                    self._assign_id(exercise, category, level)
+
+                masks = [contraindication_mask(ex) for ex in exercises]
+                for exercise, ex_mask in zip(exercises, masks):
+                    self.masks_by_id[exercise['id']] = ex_mask
+                search_entries.extend(
+                    (ex, category, level, ex_mask) for ex, ex_mask in zip(exercises, masks)
+                )
+                for constraint_mask in range(ALL_CONSTRAINTS_MASK + 1):
+                    self._pools[(category, level, constraint_mask)] = tuple(
+                        ex for ex, ex_mask in zip(exercises, masks)
+                        if not ex_mask & constraint_mask
+                    )
+
+        # Index de recherche (mots, catégories, intervalles numériques)
+        self.search_index = ExerciseSearchIndex(search_entries)
+
+        # Corps de /api/exercises encodé une fois par version du catalogue
+        self.exercises_json = json.dumps(self.exercises_db, sort_keys=True).encode('utf-8')
+        self.version = version or hashlib.sha256(self.exercises_json).hexdigest()
+
+    def _assign_id(self, exercise: Dict[str, Any], category: str, level: str):
+        """Attribue un identifiant unique à l'exercice s'il n'en a pas dans le fichier"""
+        exercise_id = exercise.get('id') or exercise_slug(category, level, exercise.get('name', ''))
+        base_id, suffix = exercise_id, 2
+        while exercise_id in self.by_id:
+            exercise_id = f"{base_id}-{suffix}"
+            suffix += 1
+
+        exercise['id'] = exercise_id
+        self.by_id[exercise_id] = exercise
+
+    @classmethod
+    def from_file(cls, exercises_file: str, use_snapshot: bool = True) -> 'ExerciseCatalog':
+        """
+        Charge la bibliothèque (version = empreinte SHA-256 du fichier JSON).
+
+        Si un snapshot binaire à jour existe à côté du JSON, le catalogue et tous
+        ses index en sont lus directement; sinon on repart du JSON.
+        """
+        source_mtime = os.stat(exercises_file).st_mtime
+        with open(exercises_file, 'rb') as f:
+            raw = f.read()
+        version = hashlib.sha256(raw).hexdigest()
+
+        if use_snapshot:
+            catalog = cls._load_snapshot(snapshot_path(exercises_file), version)
+            if catalog is not None:
+                catalog.source_mtime = source_mtime
+                return catalog
+
+        return cls(
+            json.loads(raw.decode('utf-8')),
+            version=version,
+            source_mtime=source_mtime
+        )
+
+    @classmethod
+    def _load_snapshot(cls, path: str, version: str) -> Optional['ExerciseCatalog']:
+        """Lit le snapshot s'il correspond au JSON et au code courants, None sinon"""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(len(SNAPSHOT_MAGIC) + 128)
+                if header != _snapshot_header(version):
+                    return None
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+    def write_snapshot(self, path: str):
+        """Écrit le snapshot binaire du catalogue (remplacement atomique du fichier)"""
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(_snapshot_header(self.version))
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    def exercise_mask(self, exercise: Dict[str, Any]) -> int:
+        """Masque de contre-indications d'un exercice (calculé s'il n'est pas au catalogue)"""
+        ex_mask = self.masks_by_id.get(exercise.get('id'))
+        return contraindication_mask(exercise) if ex_mask is None else ex_mask
+
+    def candidates(self, category: str, level: str, constraint_mask: int) -> Tuple[Dict[str, Any], ...]:
+        """Exercices compatibles pour une catégorie, un niveau et un masque de contraintes"""
+        return self._pools.get((category, level, constraint_mask & ALL_CONSTRAINTS_MASK), ())
+
+
+def snapshot_path(exercises_file: str) -> str:
+    """Chemin du snapshot associé à un fichier d'exercices (data/exercises.snapshot)"""
+    return os.path.splitext(exercises_file)[0] + '.snapshot'
+
+
+@lru_cache(maxsize=None)
+def _code_fingerprint() -> bytes:
+    """Source des modules qui construisent les index (tokenize, pools, structure des classes pickle)"""
+    digest = hashlib.sha256()
+    for module_file in (__file__, exercise_search.__file__):
+        with open(os.path.splitext(module_file)[0] + '.py', 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest().encode('ascii')
+
+
+def _snapshot_header(version: str) -> bytes:
+    """
+    En-tête du snapshot: empreinte du JSON source et empreinte des règles et du
+    code de construction des index, pour invalider le snapshot si l'un d'eux change.
+    """
+    rules = repr((SNAPSHOT_FORMAT, CONSTRAINT_FLAGS, CONTRAINDICATION_KEYWORDS)).encode('utf-8')
+    fingerprint = hashlib.sha256(rules + _code_fingerprint()).hexdigest()
+    return SNAPSHOT_MAGIC + version.encode('ascii') + fingerprint.encode('ascii')
+
+
+def build_snapshot(exercises_file: str) -> ExerciseCatalog:
+    """Construit le catalogue depuis le JSON et écrit son snapshot"""
+    catalog = ExerciseCatalog.from_file(exercises_file, use_snapshot=False)
+    catalog.write_snapshot(snapshot_path(exercises_file))
+    return catalog
+
+
+# Construction du snapshot: python exercise_catalog.py [data/exercises.json]
+if __name__ == '__main__':
+    # Import par le nom du module pour que pickle référence exercise_catalog et non __main__
+    from exercise_catalog import build_snapshot as build
+
+    exercises_file = sys.argv[1] if len(sys.argv) > 1 else 'data/exercises.json'
+    built = build(exercises_file)
+    print(f"✅ Snapshot écrit: {snapshot_path(exercises_file)} (version {built.version[:12]})")
@@ -0,0 +1,119 @@
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Champs numériques filtrables par intervalle
+NUMERIC_FIELDS = ('calories', 'duration')
+
+
+def normalize_text(text: str) -> str:
+    """Minuscules sans accents, pour comparer 'Étirements' et 'etirement'"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    """Découpe un texte normalisé en mots"""
+    return re.findall(r'[a-z0-9]+', normalize_text(text))
+
+
+class ExerciseSearchIndex:
+    """
+    Index de recherche construit une fois par version du catalogue.
+
+    - index inversé mot -> exercices (recherche par préfixe sur le vocabulaire trié)
+    - index par catégorie, niveau et unité
+    - tableaux triés pour les intervalles de calories et de durée
+    Les exercices sont désignés par leur rang dans le catalogue, ce qui donne
+    un ordre de résultats stable pour la pagination.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[Dict[str, Any], str, str, int]]):
+        self.exercises: List[Dict[str, Any]] = []
+        self.masks: List[int] = []
+        self.tokens: Dict[str, Set[int]] = {}
+        self.categories: Dict[str, Set[int]] = {}
+        self.levels: Dict[str, Set[int]] = {}
+        self.units: Dict[str, Set[int]] = {}
+
+        numeric_values: Dict[str, List[Tuple[float, int]]] = {field: [] for field in NUMERIC_FIELDS}
+
+        for ordinal, (exercise, category, level, mask) in enumerate(entries):
+            self.exercises.append(exercise)
+            self.masks.append(mask)
+
+            for token in tokenize(exercise.get('name', '')):
+                self.tokens.setdefault(token, set()).add(ordinal)
+            self.categories.setdefault(category, set()).add(ordinal)
+            self.levels.setdefault(level, set()).add(ordinal)
+            self.units.setdefault(exercise.get('defaultUnit', ''), set()).add(ordinal)
+
+            for field in NUMERIC_FIELDS:
+                if isinstance(exercise.get(field), (int, float)):
+                    numeric_values[field].append((exercise[field], ordinal))
+
+        self.vocabulary = sorted(self.tokens)
+
+        # Valeurs triées et rangs correspondants, pour les recherches par intervalle
+        self.numeric_keys: Dict[str, List[float]] = {}
+        self.numeric_ordinals: Dict[str, List[int]] = {}
+        for field, values in numeric_values.items():
+            values.sort()
+            self.numeric_keys[field] = [value for value, _ in values]
+            self.numeric_ordinals[field] = [ordinal for _, ordinal in values]
+
+    def _match_token(self, prefix: str) -> Set[int]:
+        """Exercices dont un mot du nom commence par le préfixe"""
+        matches = set()
+        position = bisect_left(self.vocabulary, prefix)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(prefix):
+            matches |= self.tokens[self.vocabulary[position]]
+            position += 1
+        return matches
+
+    def _match_range(self, field: str, minimum: Optional[float], maximum: Optional[float]) -> Set[int]:
+        """Exercices dont la valeur du champ est dans [minimum, maximum]"""
+        keys = self.numeric_keys[field]
+        start = 0 if minimum is None else bisect_left(keys, minimum)
+        end = len(keys) if maximum is None else bisect_right(keys, maximum)
+        return set(self.numeric_ordinals[field][start:end])
+
+    def search(self, query: str = '', category: Optional[str] = None, difficulty: Optional[str] = None,
+               unit: Optional[str] = None, ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+               exclude_mask: int = 0) -> List[Dict[str, Any]]:
+        """
+        Retourne les exercices correspondant à tous les critères, dans l'ordre du catalogue.
+
+        ranges: {'calories': (min, max), 'duration': (min, max)}, bornes incluses ou None.
+        exclude_mask: masque de contraintes, les exercices contre-indiqués sont écartés.
+        """
+        candidate_sets = []
+
+        for token in tokenize(query):
+            candidate_sets.append(self._match_token(token))
+        if category is not None:
+            candidate_sets.append(self.categories.get(category, set()))
+        if difficulty is not None:
+            candidate_sets.append(self.levels.get(difficulty, set()))
+        if unit is not None:
+            candidate_sets.append(self.units.get(unit, set()))
+        for field, (minimum, maximum) in (ranges or {}).items():
+            if minimum is not None or maximum is not None:
+                candidate_sets.append(self._match_range(field, minimum, maximum))
+
+        if candidate_sets:
+            # Intersection en partant de l'ensemble le plus petit
+            candidate_sets.sort(key=len)
+            ordinals = set(candidate_sets[0])
+            for candidates in candidate_sets[1:]:
+                ordinals &= candidates
+                if not ordinals:
+                    break
+        else:
+            ordinals = range(len(self.exercises))
+
+        return [
+            self.exercises[ordinal] for ordinal in sorted(ordinals)
+            if not self.masks[ordinal] & exclude_mask
+        ]
@@ -0,0 +1,67 @@
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+
+class KeywordMatcher:
+    """
+    Automate d'Aho-Corasick sur un ensemble de mots-clés.
+
+    Chaque mot-clé est associé à un ou plusieurs labels. Un seul parcours du
+    texte suffit à retrouver tous les labels dont au moins un mot-clé apparaît
+    (comme sous-chaîne, à l'image de `word in text`), quel que soit le nombre
+    de mots-clés du vocabulaire.
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, Hashable]]):
+        # Transitions de l'automate : un dict caractère -> état par état
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[frozenset] = [frozenset()]
+
+        outputs: List[Set[Hashable]] = [set()]
+        for keyword, label in keywords:
+            state = 0
+            for char in keyword.lower():
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append(set())
+                state = next_state
+            outputs[state].add(label)
+
+        self._build_failure_links(outputs)
+
+    def _build_failure_links(self, outputs: List[Set[Hashable]]):
+        """Calcule les liens d'échec (parcours en largeur) et fusionne les sorties"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                outputs[next_state] |= outputs[self._fail[next_state]]
+
+        self._output = [frozenset(labels) for labels in outputs]
+
+    def find_labels(self, text: str) -> Set[Hashable]:
+        """Retourne l'ensemble des labels présents dans le texte (texte déjà en minuscules)"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found = set()
+        state = 0
+
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+
+        return found
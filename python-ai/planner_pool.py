@@ -0,0 +1,79 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from ai_engine import AIExercisePlanner
+
+# Planificateur propre à chaque processus de travail (créé par _init_worker)
+_worker_planner: Optional[AIExercisePlanner] = None
+
+
+class PlannerPoolFull(Exception):
+    """La file d'attente du pool est pleine"""
+
+
+def _init_worker(exercises_file: str, cache_size: int):
+    """Charge le catalogue et ses index une seule fois par processus"""
+    global _worker_planner
+    _worker_planner = AIExercisePlanner(exercises_file, cache_size=cache_size)
+
+
+def _generate_in_worker(user_request: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    return _worker_planner.generate_complete_program(user_request, **options)
+
+
+class PlannerPool:
+    """
+    Pool de processus pour la génération de programmes (travail CPU pur Python).
+
+    Le nombre de tâches en attente ou en cours est borné par queue_limit: au-delà,
+    submit() lève PlannerPoolFull (ou attend une place si block=True).
+    """
+
+    def __init__(self, exercises_file: str, workers: int, queue_limit: int, cache_size: int = 64):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(exercises_file, cache_size)
+        )
+        self._slots = threading.BoundedSemaphore(queue_limit)
+
+    def submit(self, user_request: str, options: Dict[str, Any], block: bool = False) -> Future:
+        """Soumet une génération et retourne son Future"""
+        if not self._slots.acquire(blocking=block):
+            raise PlannerPoolFull(f'planner queue is full ({self.queue_limit} pending)')
+
+        try:
+            future = self._executor.submit(_generate_in_worker, user_request, options)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def generate_ordered(self, jobs: Iterable[Tuple[Any, Optional[Tuple[str, Dict[str, Any]]]]],
+                         window: Optional[int] = None) -> Iterator[Tuple[Any, Optional[Future]]]:
+        """
+        Soumet les demandes au fil de l'eau et rend leurs Futures dans l'ordre d'entrée.
+
+        jobs: paires (clé, (user_request, options)); un job None est rendu tel quel
+        avec un Future None. Au plus `window` demandes sont en vol à la fois (par
+        défaut deux par processus), ce qui borne la mémoire quelle que soit la
+        taille du lot.
+        """
+        window = window or self.workers * 2
+        pending = deque()
+
+        for key, job in jobs:
+            pending.append((key, self.submit(*job, block=True) if job is not None else None))
+            if len(pending) >= window:
+                yield pending.popleft()
+
+        while pending:
+            yield pending.popleft()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class ProgramCache:
+    """
+    Cache LRU borné des programmes générés, partagé entre les threads Flask.
+
+    Les valeurs sont partagées entre toutes les réponses : elles ne doivent pas
+    être modifiées par l'appelant.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retourne la valeur en cache (et la marque comme récente), None sinon"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Ajoute une valeur en évinçant la moins récemment utilisée si besoin"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Vide le cache (les compteurs sont conservés)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Compteurs de hits/misses et taille courante"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses
+            }
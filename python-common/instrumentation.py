@@ -0,0 +1,228 @@
+"""
+Instrumentation partagée des services Flask Python (python-ai, ai_model_doctor).
+
+Histogrammes de latence par route et par étape, compteurs (erreurs, caches),
+exposés au format texte Prometheus sur /metrics.
+
+Usage:
+    metrics = MetricsRegistry('wellora_ai')
+    instrument_flask(app, metrics)
+    with metrics.stage('plan_generation'):
+        ...
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Bornes des histogrammes de latence, en secondes (de 100 µs à 10 s)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Compteur monotone étiqueté"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    """Valeur instantanée étiquetée (peut monter et descendre)"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+class CallbackMetric:
+    """
+    Métrique lue au moment de l'export, pour les compteurs tenus ailleurs
+    (statistiques d'un cache, profondeur d'une file...).
+    callback() retourne {tuple de valeurs d'étiquettes: valeur}.
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Sequence[str],
+                 callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for key, value in self.callback().items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Histogramme cumulatif étiqueté (bornes fixes)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # étiquettes -> [comptes par intervalle (+Inf en dernier), somme, total]
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            snapshot = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        for key, counts, total_sum, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f'{self.name}_bucket', labels, cumulative
+            yield f'{self.name}_sum', _format_labels(self.labelnames, key), total_sum
+            yield f'{self.name}_count', _format_labels(self.labelnames, key), count
+
+
+class MetricsRegistry:
+    """Ensemble des métriques d'un service, préfixées par son espace de noms"""
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+        self.request_duration = self.histogram(
+            'http_request_duration_seconds', 'Durée de traitement des requêtes HTTP',
+            ('route', 'method', 'status')
+        )
+        self.request_errors = self.counter(
+            'http_request_errors_total', 'Réponses HTTP en erreur (statut >= 500)',
+            ('route', 'method', 'status')
+        )
+        self.stage_duration = self.histogram(
+            'stage_duration_seconds', 'Durée des étapes internes de traitement', ('stage',)
+        )
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(f'{self.namespace}_{name}', documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(f'{self.namespace}_{name}', documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(f'{self.namespace}_{name}', documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, kind: str, labelnames: Sequence[str],
+                 callback: Callable[[], Dict[Tuple[str, ...], float]]) -> CallbackMetric:
+        return self._register(CallbackMetric(f'{self.namespace}_{name}', documentation, kind, labelnames, callback))
+
+    @contextmanager
+    def stage(self, name: str):
+        """Chronomètre une étape (analyse, génération, predict...) dans stage_duration_seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_duration.observe(time.perf_counter() - started, stage=name)
+
+    def render(self) -> str:
+        """Export au format texte Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def instrument_flask(app, registry: MetricsRegistry, metrics_path: str = '/metrics'):
+    """
+    Mesure la durée de chaque requête par route (gabarit de l'URL, pas l'URL brute),
+    compte les réponses en erreur et ajoute la route d'export /metrics.
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = getattr(g, '_metrics_started', None)
+        if started is not None and request.path != metrics_path:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            labels = {'route': route, 'method': request.method, 'status': response.status_code}
+            registry.request_duration.observe(time.perf_counter() - started, **labels)
+            if response.status_code >= 500:
+                registry.request_errors.inc(**labels)
+        return response
+
+    def metrics():
+        return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+    app.add_url_rule(metrics_path, 'metrics', metrics, methods=['GET'])
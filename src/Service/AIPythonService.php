@@ -49,7 +49,7 @@ class AIPythonService
     {
         // 1. Appeler l'API Python
         $response = $this->httpClient->request('POST', $this->pythonApiUrl . '/api/generate-program', [
-            'json' => ['user_request' => $userRequest]
+            'json' => ['user_request' => $userRequest, 'compact' => true]
         ]);
 
         if ($response->getStatusCode() !== 200) {
@@ -68,7 +68,7 @@ class AIPythonService
         $goal = $this->createGoalFromAI($program['goal'], $patient);
         
         // 3. Créer et sauvegarder les DailyPlans et Exercises
-        $this->createDailyPlansFromAI($program['daily_plans'], $goal);
+        $this->createDailyPlansFromAI($program['daily_plans'], $goal, $program['exercises'] ?? []);
 
         // 4. Retourner le résultat
         return [
@@ -77,6 +77,44 @@ class AIPythonService
         ];
     }
 
+    /**
+     * Génère plusieurs programmes en un seul appel (réponse NDJSON lue en flux).
+     *
+     * Chaque demande est ['id' => ..., 'user_request' => ..., 'seed' => ...] ;
+     * les résultats sont produits un par un dès qu'une ligne complète est reçue.
+     *
+     * @param array<int, array<string, mixed>> $requests
+     * @return \Generator<int, array<string, mixed>>
+     */
+    public function generatePrograms(array $requests): \Generator
+    {
+        $response = $this->httpClient->request('POST', $this->pythonApiUrl . '/api/generate-programs', [
+            'json' => ['requests' => $requests]
+        ]);
+
+        if ($response->getStatusCode() !== 200) {
+            throw new \Exception('Erreur lors de l\'appel à l\'IA Python');
+        }
+
+        $buffer = '';
+        foreach ($this->httpClient->stream($response) as $chunk) {
+            $buffer .= $chunk->getContent();
+
+            while (($position = strpos($buffer, "\n")) !== false) {
+                $line = substr($buffer, 0, $position);
+                $buffer = substr($buffer, $position + 1);
+
+                if ($line !== '') {
+                    yield json_decode($line, true, 512, JSON_THROW_ON_ERROR);
+                }
+            }
+        }
+
+        if (trim($buffer) !== '') {
+            yield json_decode($buffer, true, 512, JSON_THROW_ON_ERROR);
+        }
+    }
+
     /**
      * Crée un Goal à partir des données IA
      */
@@ -118,9 +156,15 @@ class AIPythonService
 
     /**
      * Crée les DailyPlans à partir des données IA
+     *
+     * En mode compact, les plans ne contiennent que des IDs ('exercise_ids') résolus
+     * dans $exercisesById ; chaque exercice (avec ses surcharges éventuelles) n'est
+     * alors cherché qu'une seule fois.
      */
-    private function createDailyPlansFromAI(array $dailyPlansData, Goal $goal): void
+    private function createDailyPlansFromAI(array $dailyPlansData, Goal $goal, array $exercisesById = []): void
     {
+        $exerciseEntities = [];
+
         foreach ($dailyPlansData as $planData) {
             $dailyPlan = new DailyPlan();
             $dailyPlan->setDate(new \DateTime($planData['date']));
@@ -134,6 +178,20 @@ class AIPythonService
             $this->entityManager->persist($dailyPlan);
             
             // Créer ou associer les exercices
+            if (isset($planData['exercise_ids'])) {
+                foreach ($planData['exercise_ids'] as $exerciseId) {
+                    // Les surcharges diffèrent d'un plan à l'autre : elles font partie de la clé
+                    $overrides = $planData['overrides'][$exerciseId] ?? [];
+                    $cacheKey = $exerciseId . ($overrides ? ':' . md5(json_encode($overrides)) : '');
+                    if (!isset($exerciseEntities[$cacheKey])) {
+                        $exerciseData = array_merge($exercisesById[$exerciseId] ?? [], $overrides);
+                        $exerciseEntities[$cacheKey] = $this->findOrCreateExercise($exerciseData);
+                    }
+                    $dailyPlan->addExercice($exerciseEntities[$cacheKey]);
+                }
+                continue;
+            }
+
             foreach ($planData['exercices'] as $exerciseData) {
                 $exercise = $this->findOrCreateExercise($exerciseData);
                 $dailyPlan->addExercice($exercise);